@@ -1,6 +1,78 @@
 import numpy as np
-import random
+from collections import deque
 from enum import Enum
+from functools import lru_cache
+from frontier import GoalDistanceField
+from rng import RandomStream, default_seed
+from tiled_grid import TiledGrid
+
+SEARCH_ABANDONED = object() # returned by search_trajectory when it runs out of budget
+
+# Offsets of the eight neighbouring cells, in the order possible_steps visits them
+STEP_OFFSETS = np.array([ (dr, dc) for dr in range(-1, 2) for dc in range(-1, 2) if (dr, dc) != (0, 0) ])
+
+@lru_cache(maxsize=None)
+def stencil_kernel(radius, center_offset, initial_scale_factor, delta):
+    """
+    pdm deltas for every cell within radius of a zone centre, scaled by inverse square distance from the agent
+    center_offset is where the zone centre sits relative to the agent - (0, 0) for zones around the agent itself
+    computed with the same scalar arithmetic as update_pdm so slice updates match the per-cell ones exactly
+    """
+    off_r, off_c = center_offset
+    kernel = np.zeros((2 * radius + 1, 2 * radius + 1))
+    for dr in range(-radius, radius + 1):
+        for dc in range(-radius, radius + 1):
+            x, y = off_r + dr, off_c + dc
+            distance = (y ** 2 + x ** 2) ** (1/2)
+            scale_factor = initial_scale_factor * (1 / (distance ** 2) if distance != 0 else 1)
+            kernel[dr + radius, dc + radius] = delta * scale_factor
+    kernel.flags.writeable = False
+    return kernel
+
+def plan_on_maps(pos, pdm, explored, previous_goal_mask):
+    """
+    an agent's breadth first search run on bare maps, for planning outside the agent (e.g. in another process)
+    returns (trajectory, nodes expanded)
+    """
+    planner = Agent.__new__(Agent)
+    planner.pos = pos
+    planner.pdm, planner.explored, planner.previous_goal_mask = pdm, explored, previous_goal_mask
+    trajectory = planner.search_trajectory()
+    return trajectory, planner.last_search_expanded
+
+@lru_cache(maxsize=None)
+def adjacency_table(shape):
+    """
+    flat indices of every cell's in-bounds neighbours, in STEP_OFFSETS order and packed to the front of each row
+    returns (neighbors, counts) - neighbors[flat index, :counts[flat index]] are that cell's neighbours
+    built once per map shape and shared by every agent on it
+    """
+    ROWS, COLS = shape
+    rows, cols = np.divmod(np.arange(ROWS * COLS), COLS)
+    target_rows, target_cols = rows[:, None] + STEP_OFFSETS[:, 0], cols[:, None] + STEP_OFFSETS[:, 1]
+    valid = (target_rows >= 0) & (target_rows < ROWS) & (target_cols >= 0) & (target_cols < COLS)
+    return pack_adjacency(target_rows * COLS + target_cols, valid)
+
+def pack_adjacency(targets, valid):
+    # A stable sort on ~valid moves the valid neighbours to the front without reordering them
+    order = np.argsort(~valid, axis=1, kind="stable")
+    neighbors = np.take_along_axis(np.where(valid, targets, 0), order, axis=1).astype(np.int32)
+    counts = valid.sum(axis=1)
+    neighbors.flags.writeable = False
+    counts.flags.writeable = False
+    return neighbors, counts
+
+def exclude_cells(table, blocked):
+    """
+    copy of adjacency rows (neighbors, counts) without the entries set in blocked, which has the shape of neighbors
+    - e.g. rows for every agent's position, blocked where that agent knows there is an obstacle
+    a row whose neighbours are all blocked keeps them, so there is always somewhere to step
+    """
+    neighbors, counts = table
+    in_bounds = np.arange(neighbors.shape[1]) < counts[:, None]
+    valid = in_bounds & ~np.asarray(blocked, dtype=bool)
+    valid |= in_bounds & ~valid.any(axis=1, keepdims=True)
+    return pack_adjacency(neighbors, valid)
 
 class Agent:
     EPSILON = 0.6
@@ -31,15 +103,26 @@ class Agent:
 
     PREVIOUS_GOAL_WINDOW = 10
     PREVIOUS_GOAL_RADIUS = 1
+
+    SYNC_TILE_SIZE = 16 # region size for delta peer synchronization
+
+    INCREMENTAL_SEARCH_BUDGET = 256 # nodes the plain search may expand before incremental planning takes over
     
     
-    def __init__(self, initial_pdm, initial_coords = (0, 0)):
-        self.pdm = np.copy(initial_pdm) # numpy array
+    def __init__(self, initial_pdm, initial_coords = (0, 0), rng=None):
+        self.rng = rng if rng is not None else RandomStream(default_seed()) # every random draw this agent makes
+        self.pdm = initial_pdm.copy() if isinstance(initial_pdm, TiledGrid) else np.copy(initial_pdm) # numpy array or TiledGrid
         self.pos = initial_coords
 
         self.goal_satisfied = False # Flips when environment informs agent that they have explored enough
 
-        self.explored = np.zeros(self.pdm.shape)
+        # Delta peer synchronization, off unless enable_delta_sync is called
+        self.tile_versions = None # version stamp of the last change to each SYNC_TILE_SIZE region of pdm/explored
+        self.version_clock = 0
+        self.peer_versions = {} # peer agent -> its tile_versions as of the last merge
+
+        self.explored = self.new_map(0.0)
+        self.explored_listener = None # called with coords the first time this agent visits them
         self.update_explored(initial_coords)
 
         self.trajectory = None
@@ -48,11 +131,79 @@ class Agent:
         self.previous_positions = [None] * self.PATH_DANGER_WINDOW
 
         self.previous_goals = [None] * self.PREVIOUS_GOAL_WINDOW
+        self.previous_goal_mask = self.new_map(False, dtype=bool) # cells within PREVIOUS_GOAL_RADIUS of a recent goal
 
         self.other_agents = []
+        self.neighbor_index = None # shared AgentGrid, set by the environment
+        self.frontier_field = None # shared FrontierField, set by the environment when planning from it
+        self.goal_field = None # this agent's GoalDistanceField, kept between replans once enable_incremental_planning is called
+        self.lookahead = None # shared LookaheadPlanner that may have this agent's next trajectory ready, set by the environment
+        self.available_others_cache = None
+        self.dynamic_danger_cache = None
 
         self.hotspots = set()
 
+        self.last_search_expanded = 0 # nodes the last get_new_trajectory call expanded
+        self.recoveries = 0 # times this agent fell back to the recovery policy
+
+    def new_map(self, fill, dtype=float):
+        """
+        map of the same shape and storage kind as the pdm - tiled pdms get lazily allocated tiled maps
+        """
+        if isinstance(self.pdm, TiledGrid):
+            return TiledGrid(self.pdm.shape, default=fill, dtype=dtype, tile_size=self.pdm.tile_size)
+        return np.full(self.pdm.shape, fill, dtype=dtype)
+
+    def get_state(self):
+        """
+        everything that changes while the agent runs, for checkpointing
+        """
+        return {
+            "pdm": self.map_state(self.pdm),
+            "explored": self.map_state(self.explored),
+            "pos": self.pos,
+            "goal_satisfied": self.goal_satisfied,
+            "trajectory": None if self.trajectory is None else list(self.trajectory),
+            "trajectory_step": self.trajectory_step,
+            "previous_positions": list(self.previous_positions),
+            "previous_goals": list(self.previous_goals),
+            "previous_goal_mask": self.map_state(self.previous_goal_mask),
+            "hotspots": set(self.hotspots),
+            "tile_versions": None if self.tile_versions is None else self.tile_versions.copy(),
+            "version_clock": self.version_clock,
+            "rng": self.rng.get_state(),
+            "recoveries": self.recoveries,
+        }
+
+    def map_state(self, grid):
+        # Tiled maps keep only their allocated tiles, so a checkpoint stays as sparse as the maps
+        return grid.get_state() if isinstance(grid, TiledGrid) else np.array(grid)
+
+    def restore_map(self, grid, state):
+        if isinstance(grid, TiledGrid) and isinstance(state, dict):
+            grid.set_state(state)
+        else:
+            grid[...] = state
+
+    def set_state(self, state):
+        # Write into the existing arrays so anything holding views onto them stays in sync
+        self.restore_map(self.pdm, state["pdm"])
+        self.restore_map(self.explored, state["explored"])
+        self.restore_map(self.previous_goal_mask, state["previous_goal_mask"])
+        self.pos = state["pos"]
+        self.goal_satisfied = state["goal_satisfied"]
+        self.trajectory = state["trajectory"]
+        self.trajectory_step = state["trajectory_step"]
+        self.previous_positions = list(state["previous_positions"])
+        self.previous_goals = list(state["previous_goals"])
+        self.hotspots = set(state["hotspots"])
+        self.tile_versions = None if state["tile_versions"] is None else state["tile_versions"].copy()
+        self.version_clock = state["version_clock"]
+        self.rng.set_state(state["rng"])
+        self.recoveries = state.get("recoveries", 0)
+        self.available_others_cache = None
+        self.dynamic_danger_cache = None
+
     def inform_goal_completed(self):
         # print("goal reached")
         self.goal_satisfied = True
@@ -60,61 +211,117 @@ class Agent:
     def share_other_agents(self, other_agents):
         self.other_agents = other_agents
 
-    def other_agent_access(self, other_agent):
+    def other_agent_in_range(self, other_agent):
         my_pos, other_pos = self.pos, other_agent.pos
         x1, y1 = my_pos
         x2, y2 = other_pos
         distance = ((y2 - y1) ** 2 + (x2 - x1) ** 2) ** (1/2)
+        return distance <= self.COMMUNICATION_THRESHOLD
 
-        if distance <= self.COMMUNICATION_THRESHOLD:
+    def other_agent_access(self, other_agent):
+        if self.other_agent_in_range(other_agent):
             return (other_agent.pos, other_agent.pdm, other_agent.explored)
         else:
             return None
+
+    def get_available_agents(self):
+        if self.neighbor_index is None:
+            return [other for other in self.other_agents if self.other_agent_in_range(other)]
+
+        # Nobody has moved since the last lookup, so the cached neighbour list still holds
+        cache_key = (self.neighbor_index.version, self.pos)
+        if self.available_others_cache is not None and self.available_others_cache[0] == cache_key:
+            return self.available_others_cache[1]
+        available = [other for other in self.neighbor_index.nearby(self.pos) if other is not self and self.other_agent_in_range(other)]
+        self.available_others_cache = (cache_key, available)
+        return available
     
     def get_available_others(self):
-        other_agents_data = []
-        for other_agent in self.other_agents:
-            data = self.other_agent_access(other_agent)
-            if data is not None:
-                other_agents_data.append(data)
-        return other_agents_data
+        return [ (other.pos, other.pdm, other.explored) for other in self.get_available_agents() ]
 
     def add_new_goal(self, goal_coords):
-        self.previous_goals.pop(0)
+        expired_goal = self.previous_goals.pop(0)
         self.previous_goals.append(goal_coords)
 
+        if expired_goal is not None:
+            self.previous_goal_mask[self.radius_slices(expired_goal, self.PREVIOUS_GOAL_RADIUS)] = False
+        # Goals still in the window may overlap the expired one, so reapply all of them
+        for prev_goal in self.previous_goals:
+            if prev_goal is not None:
+                self.previous_goal_mask[self.radius_slices(prev_goal, self.PREVIOUS_GOAL_RADIUS)] = True
+
     def close_to_previous_goals(self, coords):
-        valid_prev_goals = [ coord for coord in self.previous_goals if coord is not None ]
-        danger_set = set()
-        for prev_goal in valid_prev_goals:
-            danger_coords = self.get_coords_in_radius(prev_goal, radius=self.PREVIOUS_GOAL_RADIUS)
-            danger_set |= set(danger_coords)
-        return coords in danger_set
+        return bool(self.previous_goal_mask[*coords])
 
     def get_new_trajectory(self):
-        queue = [ (self.pos,) ]
-        seen = set()
-        goal_func = lambda c: not self.explored[*c]
+        """
+        breadth first search outwards from the current position for the nearest unexplored cell that is not near a recently abandoned goal
+        returns the path to it (excluding the current position), or None if there is no such cell
+        with a shared frontier field the path is read off the field instead, and the search only runs if that fails
+        with incremental planning, goals the search does not reach within INCREMENTAL_SEARCH_BUDGET nodes are read off
+        the agent's own goal field instead, which is only repaired where the goal set changed since it was last used
+        with a look-ahead planner, a trajectory it planned in the background is used if it is still valid
+        """
+        if self.lookahead is not None:
+            trajectory = self.lookahead.claim(self)
+            if trajectory is not None:
+                return trajectory
+
+        if self.frontier_field is not None:
+            trajectory = self.frontier_field.trajectory_from(self)
+            if trajectory is not None:
+                self.last_search_expanded = len(trajectory)
+                return trajectory
+
+        if self.goal_field is not None:
+            # Nearby goals are found as quickly by the search itself, and exactly as it would find them
+            trajectory = self.search_trajectory(max_expanded=self.INCREMENTAL_SEARCH_BUDGET)
+            if trajectory is not SEARCH_ABANDONED:
+                return trajectory
+            trajectory = self.goal_field.trajectory_from(self)
+            self.last_search_expanded += self.goal_field.last_repaired
+            return trajectory
+
+        return self.search_trajectory()
+
+    def search_trajectory(self, max_expanded=None):
+        """
+        the breadth first search behind get_new_trajectory
+        gives up and returns SEARCH_ABANDONED once it has expanded max_expanded nodes
+        """
+        queue = deque([self.pos])
+        parents = {self.pos: None}
+        explored, previous_goal_mask = self.explored, self.previous_goal_mask
+        self.last_search_expanded = 0
         while queue:
-            path = queue.pop(0)
-            coords = path[-1]
+            if max_expanded is not None and len(parents) - len(queue) >= max_expanded:
+                self.last_search_expanded = max_expanded
+                return SEARCH_ABANDONED
+            coords = queue.popleft()
             neighbors = self.possible_steps(coords)
             for neighbor in neighbors:
-                new_path = path + (neighbor,)
-                if goal_func(neighbor) and not self.close_to_previous_goals(neighbor):
-                    final_path = list(new_path[1:])
+                if not explored[*neighbor] and not previous_goal_mask[*neighbor]:
+                    final_path = [neighbor]
+                    while coords != self.pos:
+                        final_path.append(coords)
+                        coords = parents[coords]
+                    final_path.reverse()
+                    self.last_search_expanded = len(parents) - len(queue)
                     # print(final_path)
                     return final_path
-                if neighbor not in seen:
-                    seen.add(neighbor)
-                    queue.append(new_path)
+                if neighbor not in parents:
+                    parents[neighbor] = coords
+                    queue.append(neighbor)
+        self.last_search_expanded = len(parents)
 
-    def get_next_action(self):
+    def get_next_action(self, possible_next_coords=None):
         """
         returns action that agent should execute - either task policy or recovery policy
+        possible_next_coords can be passed in when the caller has already generated them
         """
 
-        possible_next_coords = self.get_next_coordinates()
+        if possible_next_coords is None:
+            possible_next_coords = self.get_next_coordinates()
         task_action = self.task_policy(possible_next_coords)
 
         # Decide if safe
@@ -130,6 +337,7 @@ class Agent:
             self.add_new_goal(prev_goal)
         
         self.invalidate_trajectory()
+        self.recoveries += 1
         recovery_action = self.recovery_step(possible_next_coords)
         # print("Took recovery", recovery_action)
 
@@ -155,7 +363,7 @@ class Agent:
             if self.is_safe(coord):
                 safe_actions.append(coord)
         if len(safe_actions) > 0:
-            return random.choice(safe_actions)
+            return self.rng.choice(safe_actions)
         return min(possible_next_coords, key=lambda x: self.pdm[*x])
 
     def recovery_step(self, possible_next_coords) -> tuple:
@@ -175,24 +383,26 @@ class Agent:
                     safest = [next_coord]
                     safest_prob = pnext_yob_violation 
 
-        return random.choice(safest)
+        return self.rng.choice(safest)
 
     def possible_steps(self, pos):
-        ROWS, COLS = self.pdm.shape
-        next_coordinates = []
-
-        r, c = pos
-        for dr in range(-1, 2):
-            for dc in range(-1, 2):
-                new_r, new_c = r + dr, c + dc
-                if (dr, dc) == (0, 0) or not (0 <= new_r < ROWS and 0 <= new_c < COLS):
-                    continue
-                next_coordinates.append( (new_r, new_c) )
-        
+        """
+        neighbouring cells of pos, safest first (ties keep STEP_OFFSETS order)
+        """
+        shape = self.pdm.shape
+        COLS = shape[1]
+        neighbors, counts = adjacency_table(shape)
+        flat = pos[0] * COLS + pos[1]
+        next_flat = neighbors[flat, :counts[flat]].tolist()
+
         # if random.random() > 0.85:
         # random.shuffle(next_coordinates)
-        danger_sorted_coords = sorted(next_coordinates, key=lambda c: self.pdm[*c])
-        return danger_sorted_coords
+        if isinstance(self.pdm, TiledGrid):
+            danger = [ self.pdm[divmod(ix, COLS)] for ix in next_flat ]
+        else:
+            danger = self.pdm.ravel().take(next_flat).tolist()
+        # sorted is stable, so this is a stable argsort of at most eight values
+        return [ divmod(next_flat[ix], COLS) for ix in sorted(range(len(next_flat)), key=danger.__getitem__) ]
 
     def get_next_coordinates(self):
         return self.possible_steps(self.pos)
@@ -202,8 +412,13 @@ class Agent:
         for ix, coord in valid_coords:
             # print("Updating coord", coord, "with danger")
             scale_factor = 1 / (ix ** 2)
-            self.update_pdm(coord, obstacle=True, scale_factor=scale_factor)
+            self.apply_stencil(coord, stencil_kernel(radius=0, center_offset=(0, 0), initial_scale_factor=scale_factor, delta=self.PDM_UNSAFE_DELTA))
     
+    def radius_slices(self, coords, radius):
+        ROWS, COLS = self.pdm.shape
+        r, c = coords
+        return slice(max(r - radius, 0), min(r + radius + 1, ROWS)), slice(max(c - radius, 0), min(c + radius + 1, COLS))
+
     def get_coords_in_radius(self, coords, radius):
         ROWS, COLS = self.pdm.shape
         r, c = coords
@@ -226,22 +441,23 @@ class Agent:
         else:
             danger_radius = self.SAFE_RADIUS
 
-        danger_zone_coords = self.get_coords_in_radius(coords=coords, radius=danger_radius)
-
-        # print(danger_radius)
+        delta = self.PDM_UNSAFE_DELTA if obstacle else self.PDM_SAFE_DELTA
+        center_offset = (coords[0] - self.pos[0], coords[1] - self.pos[1])
+        kernel = stencil_kernel(radius=danger_radius, center_offset=center_offset, initial_scale_factor=initial_scale_factor, delta=delta)
+        self.apply_stencil(coords, kernel)
 
-        # danger_zone_coords = []
-        # for dr in range(-danger_radius, danger_radius + 1):
-        #     for dc in range(-danger_radius, danger_radius + 1):
-        #         danger_r, danger_c = r + dr, c + dc
-        #         if (0 <= danger_r < ROWS and 0 <= danger_c < COLS):
-        #             danger_zone_coords.append( (danger_r, danger_c) )
-        
-        for danger_coord in danger_zone_coords:
-            (x1, y1), (x2, y2) = self.pos, danger_coord
-            distance = ((y2 - y1) ** 2 + (x2 - x1) ** 2) ** (1/2)
-            scale_factor = initial_scale_factor * (1 / (distance ** 2) if distance != 0 else 1)
-            self.update_pdm(danger_coord, obstacle=obstacle, scale_factor=scale_factor)
+    def apply_stencil(self, coords, kernel):
+        """
+        adds a (2r+1)x(2r+1) kernel of pdm deltas centred on coords, clipped to the map, then clips the pdm to [0, 1]
+        """
+        radius = kernel.shape[0] // 2
+        rows, cols = self.radius_slices(coords, radius)
+        r, c = coords
+        kernel_rows = slice(rows.start - (r - radius), rows.stop - (r - radius))
+        kernel_cols = slice(cols.start - (c - radius), cols.stop - (c - radius))
+        self.pdm[rows, cols] = np.clip(self.pdm[rows, cols] + kernel[kernel_rows, kernel_cols], 0.0, 1.0)
+        if self.tile_versions is not None:
+            self.mark_changed(rows, cols)
 
     def invalidate_trajectory(self):
         self.trajectory = None
@@ -268,17 +484,68 @@ class Agent:
         return average_coord
 
     def update_others_danger(self):
+        if self.tile_versions is not None:
+            self.sync_with_peers(self.get_available_agents())
+            return
+
         communicable_poses = self.get_available_others()
-        for other_pos, other_pdm, other_explored in communicable_poses:
-            self.incorporate_other_pdm(other_pdm)
-            self.incorporate_other_explored(other_explored)
+        if not communicable_poses:
+            return
 
+        other_pdms = [other_pdm for _, other_pdm, _ in communicable_poses]
+        other_explored = [other_explored for _, _, other_explored in communicable_poses]
+        self.incorporate_other_pdms(other_pdms)
+        self.incorporate_other_explored_maps(other_explored)
+
+        # for other_pos, other_pdm, other_explored in communicable_poses:
             # dynamic_collision_spot = self.average_poses(self.pos, other_pos)
             # self.update_zone(coords=dynamic_collision_spot, initial_scale_factor=self.DYNAMIC_SCALE_FACTOR, dynamic=True)
             # self.hotspots.add(dynamic_collision_spot)
 
             # self.update_zone(coords=dynamic_collision_spot, initial_scale_factor=self.DYNAMIC_SCALE_FACTOR)
 
+    def enable_incremental_planning(self):
+        self.goal_field = GoalDistanceField(self.pdm.shape)
+
+    def enable_delta_sync(self):
+        ROWS, COLS = self.pdm.shape
+        T = self.SYNC_TILE_SIZE
+        self.tile_versions = np.zeros((-(-ROWS // T), -(-COLS // T)), dtype=np.int64)
+        r, c = self.pos # the only thing written before sync was switched on
+        self.mark_changed(slice(r, r + 1), slice(c, c + 1))
+
+    def mark_changed(self, rows, cols):
+        if self.tile_versions is None:
+            return
+        T = self.SYNC_TILE_SIZE
+        self.version_clock += 1
+        self.tile_versions[rows.start // T:(rows.stop - 1) // T + 1, cols.start // T:(cols.stop - 1) // T + 1] = self.version_clock
+
+    def sync_with_peers(self, peers):
+        """
+        merges only the regions each peer changed since this agent last merged from it
+        an untouched region still holds the initial maps, which fusing leaves as they are, so it is safe to skip
+        """
+        T = self.SYNC_TILE_SIZE
+        for peer in peers:
+            seen = self.peer_versions.get(peer)
+            stale = peer.tile_versions > (0 if seen is None else seen)
+            for tr, tc in np.argwhere(stale).tolist():
+                rows, cols = slice(tr * T, (tr + 1) * T), slice(tc * T, (tc + 1) * T)
+                self.merge_region(rows, cols, peer.pdm[rows, cols], peer.explored[rows, cols])
+            self.peer_versions[peer] = peer.tile_versions.copy()
+
+    def merge_region(self, rows, cols, other_pdm, other_explored):
+        my_pdm, my_explored = self.pdm[rows, cols], self.explored[rows, cols]
+        fused_pdm = self.fuse_pdms(my_pdm, np.asarray(other_pdm)[None])
+        merged_explored = np.maximum(my_explored, other_explored)
+        if np.array_equal(fused_pdm, my_pdm) and np.array_equal(merged_explored, my_explored):
+            return
+        # Only real changes get a new stamp, so two agents in contact stop re-sending the same region
+        self.pdm[rows, cols] = fused_pdm
+        self.explored[rows, cols] = merged_explored
+        self.mark_changed(slice(rows.start, rows.start + my_pdm.shape[0]), slice(cols.start, cols.start + my_pdm.shape[1]))
+
     def update_hotspots(self):
         for coord in self.hotspots:
             # print("hotspot", coord)
@@ -298,7 +565,10 @@ class Agent:
             self.update_zone(coords=self.pos, initial_scale_factor=self.SUCCESSFUL_MOVE_FACTOR, obstacle=False)
 
     def update_position(self, coords):
+        old_pos = self.pos
         self.pos = coords
+        if self.neighbor_index is not None:
+            self.neighbor_index.move(self, old_pos, coords)
         self.update_explored(coords)
 
         self.previous_positions.pop(0)
@@ -307,7 +577,13 @@ class Agent:
         # print(self.previous_positions)
 
     def update_explored(self, coords):
+        if self.explored[*coords]:
+            return
         self.explored[*coords] = 1
+        if self.tile_versions is not None:
+            self.mark_changed(slice(coords[0], coords[0] + 1), slice(coords[1], coords[1] + 1))
+        if self.explored_listener is not None:
+            self.explored_listener(coords)
 
     def update_pdm(self, coords: tuple[int, int], obstacle: bool, scale_factor=1):
         # if self.pdm[*coords] >= self.EPSILON:
@@ -317,6 +593,8 @@ class Agent:
         new_pdm = self.pdm[*coords] + scaled_delta
         clipped_pdm = max(min(new_pdm, 1.0), 0.0)
         self.pdm[*coords] = clipped_pdm
+        if self.tile_versions is not None:
+            self.mark_changed(slice(coords[0], coords[0] + 1), slice(coords[1], coords[1] + 1))
 
     def get_probability_obstacle(self, coords: tuple[int, int]):
         return self.pdm[*coords]
@@ -326,14 +604,7 @@ class Agent:
         returns boolean describing whether the given coord is above the epsilon safety value
         """
 
-        danger_set = set()
-        communicable_poses = self.get_available_others()
-        for other_pos, _, _ in communicable_poses:
-            spot_in_between = self.average_poses(coord1=coords, coord2=other_pos)
-            danger_coords = self.get_coords_in_radius(coords=spot_in_between, radius=self.DYNAMIC_DETECTION_RADIUS)
-            danger_set |= set(danger_coords)
-
-        if coords in danger_set:
+        if self.in_dynamic_danger(coords):
             return False
 
         safety = self.pdm[*coords]
@@ -342,27 +613,70 @@ class Agent:
         else:
             scaled_safety = safety ** (1 / 2)
             capped_safety = min(scaled_safety, self.UNSAFE_CAP)
-            random_val = random.random()
+            random_val = self.rng.random()
             return capped_safety < random_val
     
+    def in_dynamic_danger(self, coords):
+        """
+        whether coords lies within DYNAMIC_DETECTION_RADIUS of the midpoint between it and a visible peer
+        """
+        danger_mask = self.get_dynamic_danger_mask()
+        if coords in danger_mask:
+            return danger_mask[coords]
+
+        r, c = coords
+        for other in self.get_available_agents():
+            mid_r, mid_c = self.average_poses(coord1=coords, coord2=other.pos)
+            if abs(r - mid_r) <= self.DYNAMIC_DETECTION_RADIUS and abs(c - mid_c) <= self.DYNAMIC_DETECTION_RADIUS:
+                return True
+        return False
+
+    def get_dynamic_danger_mask(self):
+        """
+        dynamic danger for each of the eight moves around the current position
+        computed once per position and peer layout, so the repeated is_safe calls of a tick are lookups
+        """
+        cache_key = None if self.neighbor_index is None else (self.neighbor_index.version, self.pos)
+        if cache_key is not None and self.dynamic_danger_cache is not None and self.dynamic_danger_cache[0] == cache_key:
+            return self.dynamic_danger_cache[1]
+
+        candidates = np.array(self.pos) + STEP_OFFSETS
+        others = np.array([ other.pos for other in self.get_available_agents() ]).reshape(-1, 2)
+        midpoints = (candidates[:, None, :] + others[None, :, :]) // 2
+        in_danger = (np.abs(candidates[:, None, :] - midpoints) <= self.DYNAMIC_DETECTION_RADIUS).all(axis=2).any(axis=1)
+        danger_mask = { tuple(candidate): danger for candidate, danger in zip(candidates.tolist(), in_danger.tolist()) }
+
+        if cache_key is not None:
+            self.dynamic_danger_cache = (cache_key, danger_mask)
+        return danger_mask
+
     def incorporate_other_pdm(self, other_pdm):
-        ROWS, COLS = self.pdm.shape
-        for row in range(ROWS):
-            for col in range(COLS):
-                my_prob, other_prob = self.pdm[row, col], other_pdm[row, col]
-                highest_prob, lowest_prob = max(my_prob, other_prob), min(my_prob, other_prob)
-                if highest_prob >= self.EPSILON:
-                    new_prob = highest_prob
-                elif lowest_prob <= self.VERY_SAFE_THRESHOLD:
-                    new_prob = lowest_prob
-                else:
-                    new_prob = my_prob
-                self.pdm[row, col] = new_prob
-    
+        self.incorporate_other_pdms([other_pdm])
+
+    def incorporate_other_pdms(self, other_pdms):
+        """
+        fuses the pdms of every visible peer into this agent's pdm in one pass
+        fusing against the whole batch gives the same result as fusing the peers one at a time
+        """
+        if isinstance(self.pdm, TiledGrid):
+            self.pdm.combine(other_pdms, self.fuse_pdms)
+        else:
+            self.pdm[...] = self.fuse_pdms(self.pdm, np.asarray(other_pdms))
+
+    def fuse_pdms(self, my_pdm, stacked_pdms):
+        """
+        a cell takes the most dangerous value if anyone thinks it is unsafe, otherwise the safest value if anyone thinks it is very safe
+        """
+        highest_prob = np.maximum(my_pdm, stacked_pdms.max(axis=0))
+        lowest_prob = np.minimum(my_pdm, stacked_pdms.min(axis=0))
+        new_pdm = np.where(lowest_prob <= self.VERY_SAFE_THRESHOLD, lowest_prob, my_pdm)
+        return np.where(highest_prob >= self.EPSILON, highest_prob, new_pdm)
+
     def incorporate_other_explored(self, other_explored):
-        ROWS, COLS = self.explored.shape
-        for row in range(ROWS):
-            for col in range(COLS):
-                my_explored_val, other_explored_val = self.explored[row, col], other_explored[row, col]
-                cohesive_explored = max(my_explored_val, other_explored_val)
-                self.explored[row, col] = cohesive_explored
\ No newline at end of file
+        self.incorporate_other_explored_maps([other_explored])
+
+    def incorporate_other_explored_maps(self, other_explored_maps):
+        if isinstance(self.explored, TiledGrid):
+            self.explored.combine(other_explored_maps, lambda mine, others: np.maximum(mine, others.max(axis=0)))
+        else:
+            np.maximum(self.explored, np.asarray(other_explored_maps).max(axis=0), out=self.explored)
@@ -0,0 +1,234 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from agent import Agent
+from environment import Environment
+from rng import RandomStream
+
+SEED = 0
+
+SIZES = (30, 64, 128, 256, 512, 1024)
+AGENT_COUNTS = (2, 10, 50, 100, 500)
+DENSITIES = (0.0, 0.1, 0.3)
+
+QUICK_SIZES = (30, 64)
+QUICK_AGENT_COUNTS = (2, 10)
+QUICK_DENSITIES = (0.1,)
+
+def time_call(func, repeats=5, setup=None):
+    """
+    runs func repeats times (calling setup untimed before each run)
+    returns the min and median wall time in seconds
+    """
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return { "min": min(timings), "median": statistics.median(timings), "repeats": repeats }
+
+def random_occupancy(size, density, seed=SEED):
+    rng = np.random.default_rng(seed)
+    return (rng.random((size, size)) < density).astype(np.uint8)
+
+def quiet_environment(occupancy, num_agents, completion_percentage=1.0, environment_class=Environment, seed=SEED, **environment_args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return environment_class(occupancy, num_agents, occupancy.shape[1], occupancy.shape[0], completion_percentage, seed=seed, **environment_args)
+
+def planner_agent(size):
+    """
+    agent in the middle of an open map where everything but the border has been explored,
+    so the planner has to sweep most of the grid before it finds a frontier
+    a full window of abandoned goals sits on the border as well
+    """
+    agent = Agent(initial_pdm=np.full((size, size), 0.4), initial_coords=(size // 2, size // 2), rng=RandomStream(SEED))
+    agent.explored[1:-1, 1:-1] = 1
+    for ix in range(Agent.PREVIOUS_GOAL_WINDOW):
+        agent.add_new_goal((0, ix * size // Agent.PREVIOUS_GOAL_WINDOW))
+    return agent
+
+def bench_get_new_trajectory(size, repeats):
+    agent = planner_agent(size)
+    return time_call(agent.get_new_trajectory, repeats)
+
+def bench_incorporate_other_pdm(size, repeats):
+    rng = np.random.default_rng(SEED)
+    agent = Agent(initial_pdm=rng.random((size, size)), rng=RandomStream(SEED))
+    other_pdm = rng.random((size, size))
+    return time_call(lambda: agent.incorporate_other_pdm(other_pdm), repeats)
+
+def bench_update_zone(size, repeats, calls=1000):
+    agent = Agent(initial_pdm=np.full((size, size), 0.4), initial_coords=(size // 2, size // 2), rng=RandomStream(SEED))
+    def run():
+        for _ in range(calls):
+            agent.update_zone(agent.pos, initial_scale_factor=Agent.CRASH_SCALE_FACTOR)
+    return time_call(run, repeats)
+
+def bench_is_safe(size, num_agents, density, repeats, calls=1000):
+    environment = quiet_environment(random_occupancy(size, density), num_agents)
+    agent = environment.agents[0]
+    moves = agent.get_next_coordinates()
+    def run():
+        for ix in range(calls):
+            agent.is_safe(moves[ix % len(moves)])
+    return time_call(run, repeats)
+
+def bench_update_pos(size, num_agents, density, repeats, ticks=5):
+    environment = quiet_environment(random_occupancy(size, density), num_agents)
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(ticks):
+                environment.update_pos()
+    result = time_call(run, repeats)
+    result["ticks"] = ticks
+    return result
+
+def bench_tick_latency(size, num_agents, ticks=100, spacing=32, environment_class=Environment, **environment_args):
+    """
+    per-tick wall time on an open map the agents have already explored except for a lattice of cells spacing apart,
+    so replanning agents keep running searches of a few thousand nodes - the case lookahead_workers and
+    ParallelSwarmEnvironment are for
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = quiet_environment(random_occupancy(size, 0.0), num_agents, environment_class=environment_class, **environment_args)
+        explored = np.ones((size, size))
+        explored[spacing // 2::spacing, spacing // 2::spacing] = 0
+        for agent in environment.agents:
+            agent.explored[...] = np.maximum(explored, np.asarray(agent.explored))
+
+        timings = []
+        for _ in range(ticks):
+            start = time.perf_counter()
+            environment.update_pos()
+            timings.append(time.perf_counter() - start)
+        environment.close()
+    timings.sort()
+    return { "min": timings[0], "median": statistics.median(timings), "p99": timings[int(0.99 * (ticks - 1))], "max": timings[-1], "ticks": ticks }
+
+def bench_get_cohesive_explored_map(size, num_agents, density, repeats, calls=100):
+    environment = quiet_environment(random_occupancy(size, density), num_agents)
+    def run():
+        for _ in range(calls):
+            environment.explored_enough()
+            environment.get_cohesive_explored_map()
+    return time_call(run, repeats)
+
+def bench_read_from_file(size, density, repeats, cached):
+    with tempfile.TemporaryDirectory() as directory:
+        image_filename = os.path.join(directory, "map.png")
+        Image.fromarray(random_occupancy(size, density) * 255).save(image_filename)
+
+        environment = Environment.__new__(Environment)
+        environment.width, environment.height = size, size
+        environment.MAP_CACHE_DIR = os.path.join(directory, "cache") if cached else None
+        if cached:
+            environment.read_from_file(image_filename) # populate the cache
+        return time_call(lambda: environment.read_from_file(image_filename), repeats)
+
+def estimated_agent_bytes(size, num_agents):
+    # pdm, explored and the previous goal mask per agent
+    return num_agents * size * size * (8 + 8 + 1)
+
+def run_suite(sizes, agent_counts, densities, repeats=5, max_memory_gb=4.0, lookahead_workers=0, parallel_workers=0):
+    results = {}
+    def record(key, func):
+        results[key] = func()
+        tail = f", p99 {results[key]['p99'] * 1000:.3f} ms" if "p99" in results[key] else ""
+        print(f"{key}: {results[key]['median'] * 1000:.3f} ms{tail}", flush=True)
+
+    for size in sizes:
+        record(f"get_new_trajectory/size={size}", lambda: bench_get_new_trajectory(size, repeats))
+        record(f"incorporate_other_pdm/size={size}", lambda: bench_incorporate_other_pdm(size, repeats))
+        record(f"update_zone/size={size}", lambda: bench_update_zone(size, repeats))
+        if lookahead_workers:
+            for workers in (0, lookahead_workers):
+                record(f"tick_latency/size={size}/lookahead_workers={workers}", lambda: bench_tick_latency(size, 8, lookahead_workers=workers))
+        if parallel_workers:
+            from parallel import ParallelSwarmEnvironment
+            record(f"tick_latency/size={size}/serial", lambda: bench_tick_latency(size, 8, spacing=16))
+            record(f"tick_latency/size={size}/parallel_workers={parallel_workers}", lambda: bench_tick_latency(size, 8, spacing=16, environment_class=ParallelSwarmEnvironment, num_workers=parallel_workers))
+        for density in densities:
+            record(f"read_from_file/size={size}/density={density}", lambda: bench_read_from_file(size, density, repeats, cached=False))
+            record(f"read_from_file_cached/size={size}/density={density}", lambda: bench_read_from_file(size, density, repeats, cached=True))
+
+        for num_agents in agent_counts:
+            if estimated_agent_bytes(size, num_agents) > max_memory_gb * 1e9:
+                print(f"skipping size={size} agents={num_agents}: agent state would exceed {max_memory_gb} GB")
+                continue
+            for density in densities:
+                suffix = f"size={size}/agents={num_agents}/density={density}"
+                record(f"is_safe/{suffix}", lambda: bench_is_safe(size, num_agents, density, repeats))
+                record(f"get_cohesive_explored_map/{suffix}", lambda: bench_get_cohesive_explored_map(size, num_agents, density, repeats))
+                record(f"update_pos/{suffix}", lambda: bench_update_pos(size, num_agents, density, repeats))
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    returns (key, baseline median, current median) for every benchmark that got slower than baseline * (1 + tolerance)
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old, new = baseline[key]["median"], result["median"]
+        if new > old * (1 + tolerance):
+            regressions.append((key, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths across map sizes, agent counts and obstacle densities")
+    parser.add_argument("--quick", action="store_true", help="small grid of configurations for a fast check")
+    parser.add_argument("--sizes", type=int, nargs="+")
+    parser.add_argument("--agents", type=int, nargs="+")
+    parser.add_argument("--densities", type=float, nargs="+")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-memory-gb", type=float, default=4.0, help="skip agent counts whose pdm/explored maps would exceed this")
+    parser.add_argument("--lookahead-workers", type=int, default=0, help="also compare per-tick latency with and without this many look-ahead workers")
+    parser.add_argument("--parallel-workers", type=int, default=0, help="also compare per-tick latency of Environment and ParallelSwarmEnvironment with this many workers")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to save the results as JSON")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="fractional slowdown against the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    agent_counts = args.agents or (QUICK_AGENT_COUNTS if args.quick else AGENT_COUNTS)
+    densities = args.densities or (QUICK_DENSITIES if args.quick else DENSITIES)
+
+    results = run_suite(sizes, agent_counts, densities, repeats=args.repeats, max_memory_gb=args.max_memory_gb, lookahead_workers=args.lookahead_workers, parallel_workers=args.parallel_workers)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"saved {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for key, old, new in regressions:
+            print(f"REGRESSION {key}: {old * 1000:.3f} ms -> {new * 1000:.3f} ms ({new / old:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import time
+START = time.perf_counter() # taken before the heavier imports so startup time includes them
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import statistics
+import sys
+import numpy as np
+from runner import make_agent_class
+
+# Everything a scenario file can set, with its default
+SCENARIO_DEFAULTS = {
+    "map": None, # image or .npy occupancy grid, None for an empty grid
+    "width": 30,
+    "height": 30,
+    "num_agents": 2,
+    "completion_percentage": 0.75,
+    "ticks": 3000,
+    "seed": None,
+    "agent_constants": {},
+    "engine": "environment",
+    "environment_options": {}, # extra keyword arguments for the environment, e.g. tile_size or delta_sync
+}
+
+# engine name -> (module, environment class, agent class)
+ENGINES = {
+    "environment": ("environment", "Environment", "Agent"),
+    "swarm": ("swarm", "SwarmEnvironment", "SwarmAgent"),
+    "parallel": ("parallel", "ParallelSwarmEnvironment", "ParallelSwarmAgent"),
+}
+
+def load_scenario(path):
+    """
+    reads a scenario from a JSON or TOML file and fills in the defaults
+    a relative map path is taken relative to the scenario file
+    """
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as scenario_file:
+            scenario = tomllib.load(scenario_file)
+    else:
+        with open(path) as scenario_file:
+            scenario = json.load(scenario_file)
+
+    unknown = [ key for key in scenario if key not in SCENARIO_DEFAULTS ]
+    if unknown:
+        raise ValueError(f"Unknown scenario keys in {path}: {unknown}")
+    scenario = { **SCENARIO_DEFAULTS, **scenario }
+    if scenario["map"] is not None and not os.path.isabs(scenario["map"]):
+        # Relative to the scenario file, not to wherever the run was started from
+        scenario["map"] = os.path.join(os.path.dirname(path), scenario["map"])
+    if scenario["engine"] not in ENGINES:
+        raise ValueError(f"Unknown engine {scenario['engine']!r}, expected one of {list(ENGINES)}")
+    return scenario
+
+def build_environment(scenario):
+    module_name, environment_name, agent_name = ENGINES[scenario["engine"]]
+    module = importlib.import_module(module_name)
+    agent_class = make_agent_class(scenario["agent_constants"], getattr(module, agent_name))
+
+    occupancy_data = scenario["map"]
+    if occupancy_data is None:
+        occupancy_data = np.zeros((scenario["height"], scenario["width"]), dtype=np.uint8)
+    return getattr(module, environment_name)(
+        occupancy_data,
+        scenario["num_agents"],
+        scenario["width"],
+        scenario["height"],
+        scenario["completion_percentage"],
+        agent_class=agent_class,
+        seed=scenario["seed"],
+        **scenario["environment_options"],
+    )
+
+def tick_summary(tick_seconds):
+    if not tick_seconds:
+        return {}
+    ordered = sorted(tick_seconds)
+    return {
+        "mean_ms": 1000 * statistics.fmean(ordered),
+        "median_ms": 1000 * statistics.median(ordered),
+        "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))],
+        "max_ms": 1000 * ordered[-1],
+    }
+
+def run(scenario, visualize=False, plot=False, report_every=0, verbose=False):
+    """
+    runs a scenario and returns its final counts with startup and per-tick timing
+    the visualization and plot modules are only imported when they are asked for
+    """
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            # The simulation prints on every crash, which only slows down headless runs
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        environment = build_environment(scenario)
+        startup_seconds = time.perf_counter() - START
+
+        anim = None
+        if visualize:
+            from visualization import RobotVisualization
+            anim = RobotVisualization(environment)
+
+        tick_seconds, ratios = [], []
+        for tick in range(scenario["ticks"]):
+            tick_start = time.perf_counter()
+            environment.update_pos()
+            tick_seconds.append(time.perf_counter() - tick_start)
+            ratios.append(environment.success / environment.fail)
+            if anim is not None:
+                anim.update(environment)
+            if report_every and (tick + 1) % report_every == 0:
+                print(f"tick {tick + 1}: {environment.success} successes, {environment.fail} fails, {1000 * statistics.fmean(tick_seconds[-report_every:]):.2f} ms/tick", file=sys.stderr)
+        environment.close()
+
+    if plot:
+        import matplotlib.pyplot as plt
+        plt.plot(range(len(ratios)), ratios)
+        plt.xlabel('Iterations')
+        plt.ylabel('Ratio of Successes to Failures')
+        plt.title(f"Multiagent Recovery RL on {scenario['width']}x{scenario['height']}")
+        plt.show()
+
+    return {
+        "success": environment.success,
+        "fail": environment.fail,
+        "ticks": len(tick_seconds),
+        "explored_fraction": environment.explored_count / environment.free_cell_count,
+        "startup_seconds": startup_seconds,
+        "run_seconds": sum(tick_seconds),
+        "per_tick": tick_summary(tick_seconds),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a simulation scenario from a JSON or TOML file, headless unless asked otherwise")
+    parser.add_argument("scenario", help="scenario file - map, width, height, num_agents, completion_percentage, ticks, seed, agent_constants, engine, environment_options")
+    parser.add_argument("--ticks", type=int, help="override the scenario's tick budget")
+    parser.add_argument("--seed", type=int, help="override the scenario's seed")
+    parser.add_argument("--visualize", action="store_true", help="show the live Tk view (needs a display)")
+    parser.add_argument("--plot", action="store_true", help="plot the success/fail ratio with matplotlib at the end")
+    parser.add_argument("--report-every", type=int, default=0, help="print progress to stderr every this many ticks")
+    parser.add_argument("--output", help="also save the summary as JSON here")
+    parser.add_argument("--verbose", action="store_true", help="keep the simulation's own output")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    if args.ticks is not None:
+        scenario["ticks"] = args.ticks
+    if args.seed is not None:
+        scenario["seed"] = args.seed
+
+    summary = run(scenario, visualize=args.visualize, plot=args.plot, report_every=args.report_every, verbose=args.verbose)
+    per_tick = summary["per_tick"]
+    print(f"{summary['ticks']} ticks: {summary['success']} successes, {summary['fail']} fails, {summary['explored_fraction']:.1%} explored")
+    print(f"startup {summary['startup_seconds'] * 1000:.0f} ms, run {summary['run_seconds']:.2f} s", end="")
+    print(f", per tick mean {per_tick['mean_ms']:.2f} ms / p99 {per_tick['p99_ms']:.2f} ms / max {per_tick['max_ms']:.2f} ms" if per_tick else "")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({ "scenario": scenario, **summary }, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import numpy as np
+
+# Colour codes: 0-255 run from green (safe) to red (dangerous), -1 is an obstacle (white)
+OBSTACLE_CODE = -1
+OBSTACLE_RGB = (255, 255, 255)
+AGENT_RGB = (0, 0, 255) # blue - the agent whose pdm is shown on the panel
+OTHER_AGENT_RGB = (128, 128, 128) # gray
+
+HEX_COLORS = { code: "#%02x%02x%02x" % (code, 255 - code, 0) for code in range(256) }
+HEX_COLORS[OBSTACLE_CODE] = "#%02x%02x%02x" % OBSTACLE_RGB
+
+def pdm_color_codes(pdm, obstacles):
+    return np.where(obstacles, OBSTACLE_CODE, (np.asarray(pdm) * 255).astype(int))
+
+def color_codes_to_rgb(codes):
+    rgb = np.stack([codes, 255 - codes, np.zeros_like(codes)], axis=-1)
+    rgb[codes == OBSTACLE_CODE] = OBSTACLE_RGB
+    return rgb.astype(np.uint8)
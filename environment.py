@@ -1,66 +1,179 @@
+import contextlib
+import hashlib
+import importlib
+import os
+import pickle
+from collections import Counter
 import numpy as np
-from PIL import Image, ImageOps
 from agent import Agent
-import random
-from scipy.ndimage import gaussian_filter
+from frontier import FrontierField
+from spatial_index import AgentGrid
+from tiled_grid import TiledGrid
+from recorder import OUTCOME_SUCCESS, OUTCOME_OBSTACLE, OUTCOME_COLLISION
+from rng import spawn_streams
 
 class Environment:
-    def __init__(self, occupancy_data: str | np.ndarray, num_agents, width, height, completion_percentage):
+    MAP_CACHE_DIR = ".map_cache" # binarized maps are cached here (a relative path is next to the map file), None turns the cache off
+
+    def __init__(self, occupancy_data: str | np.ndarray, num_agents, width, height, completion_percentage, agent_class=Agent, tile_size=None, delta_sync=False, shared_frontier=False, incremental_planning=False, lookahead_workers=0, seed=None):
         self.width = width
         self.height = height
+        self.agent_class = agent_class
+        self.tile_size = tile_size # if set, agents keep their pdm and explored maps in lazily allocated tiles of this size
 
         if type(occupancy_data) is str:
             self.occupancy_grid = self.read_from_file(occupancy_data)
         else:
             self.occupancy_grid = occupancy_data
 
+        # Flat indices of every free cell, so respawns pick one directly instead of sampling until they miss obstacles
+        self.free_cells = np.flatnonzero(np.asarray(self.occupancy_grid) == 0)
+        self.respawn_avoids_agents = False # if set, agents reset after a failure never land on another agent's cell
+
+        # One stream for the environment and one per agent, all derived from the seed, so a seeded run
+        # comes out the same wherever it runs
+        self.seed = seed
+        self.rng, *agent_rngs = spawn_streams(seed, num_agents + 1)
+
         self.agents = []
-        for _ in range(num_agents):
-            agent = Agent(initial_pdm=np.full((self.height,self.width), 0.4), initial_coords=self.get_random_position())
+        for ix in range(num_agents):
+            agent = self.create_agent(ix, initial_coords=self.get_random_position(), rng=agent_rngs[ix])
             self.agents.append(agent)
 
         for ix, agent in enumerate(self.agents):
             other_agents = self.agents[:ix] + self.agents[ix + 1:]
             agent.share_other_agents(other_agents)
 
+        # Peers exchange only the map regions that changed since they last met
+        self.delta_sync = delta_sync
+        if delta_sync:
+            for agent in self.agents:
+                agent.enable_delta_sync()
+
+        # Buckets agents by communication range so each agent only checks the peers around it
+        self.agent_grid = AgentGrid(cell_size=self.agent_class.COMMUNICATION_THRESHOLD)
+        self.agent_grid.rebuild(self.agents)
+        for agent in self.agents:
+            agent.neighbor_index = self.agent_grid
+
+        # One distance-to-frontier field over the team's explored map that every agent plans from
+        self.shared_frontier = shared_frontier
+        if shared_frontier:
+            frontier_field = FrontierField(self)
+            for agent in self.agents:
+                agent.frontier_field = frontier_field
+
+        # Each agent keeps its distance-to-goal field between replans and only repairs what changed
+        self.incremental_planning = incremental_planning
+        if incremental_planning:
+            for agent in self.agents:
+                agent.enable_incremental_planning()
+
+        # Agents about to replan get their next trajectory planned in the background while the tick finishes
+        self.lookahead_workers = lookahead_workers
+        self.lookahead = None
+        if lookahead_workers:
+            from lookahead import LookaheadPlanner # pulls in multiprocessing, so only when asked for
+            self.lookahead = LookaheadPlanner(lookahead_workers, num_agents, (self.height, self.width))
+        for agent in self.agents:
+            agent.lookahead = self.lookahead
+
         self.success = 0
         self.fail = 1
 
         self.completion_percentage = completion_percentage
+        self.occupancy_source = occupancy_data if type(occupancy_data) is str else None # checkpoints reload the map from here
+
+        self.tick = 0
+        self.checkpoint_every = 0 # save a checkpoint to checkpoint_path every this many ticks, 0 turns it off - see enable_checkpoints
+        self.checkpoint_path = None
+
+        self.collisions = 0
+        self.obstacle_crashes = 0
+
+        self.recorder = None # optional TrajectoryRecorder, fed every tick
+        self.metrics = None # optional MetricsSink, fed every tick
+        self.profiler = None # set by TickProfiler.attach
+
+        # Team-wide explored map, kept up to date as agents visit new cells
+        self.free_cell_count = len(self.free_cells)
+        self.cohesive_map = np.zeros(shape=(self.height, self.width))
+        for agent in self.agents:
+            np.maximum(self.cohesive_map, agent.explored, out=self.cohesive_map)
+        self.explored_count = np.count_nonzero(self.cohesive_map)
+        for agent in self.agents:
+            agent.explored_listener = self.mark_explored
+
+    def create_agent(self, index, initial_coords, rng=None):
+        if self.tile_size:
+            initial_pdm = TiledGrid((self.height, self.width), default=0.4, tile_size=self.tile_size)
+        else:
+            initial_pdm = np.full((self.height,self.width), 0.4)
+        return self.agent_class(initial_pdm=initial_pdm, initial_coords=initial_coords, rng=rng)
+
+    def mark_explored(self, coords):
+        if self.cohesive_map[*coords]:
+            return
+        self.cohesive_map[*coords] = 1
+        self.explored_count += 1
 
     def get_cohesive_explored_map(self):
-        map_shape = (self.height, self.width)
-        self.cohesive_map = np.zeros(shape=map_shape)
-        for row in range(self.height):
-            for col in range(self.width):
-                for agent in self.agents:
-                    if agent.explored[row, col]:
-                        self.cohesive_map[row, col] = 1
-                        break
         return self.cohesive_map
 
-    def get_random_position(self):
+    def get_random_position(self, exclude_agents=False):
+        """
+        uniformly random free cell, optionally skipping cells that agents currently stand on
+        """
+        COLS = self.occupancy_grid.shape[1]
+        excluded = { agent.pos for agent in self.agents } if exclude_agents else set()
+        if len(excluded) >= len(self.free_cells):
+            excluded = set()
         while True:
-            pos = (random.randint(0, self.height-1), random.randint(0, self.width-1))
-            if self.is_occupied(pos):
+            pos = divmod(int(self.free_cells[self.rng.randrange(len(self.free_cells))]), COLS)
+            if pos in excluded:
                 continue
             return pos
 
     def read_from_file(self, image_filename):
+        """
+        loads an occupancy grid of shape (height, width) - pixels at or above 128 are obstacles
+        .npy files are memory-mapped as they are, images are binarized and cached by content hash in MAP_CACHE_DIR
+        the cache is skipped if it can't be written, e.g. next to a map in a read-only directory
+        """
+        if image_filename.endswith(".npy"):
+            pixels = np.load(image_filename, mmap_mode="r")
+            if pixels.shape != (self.height, self.width):
+                raise ValueError(f"{image_filename} holds a {pixels.shape} grid, expected {(self.height, self.width)}")
+            return pixels
+
+        cache_filename = None
+        if self.MAP_CACHE_DIR is not None:
+            with open(image_filename, "rb") as image_file:
+                digest = hashlib.sha256(image_file.read())
+            digest.update(f"{self.width}x{self.height}".encode())
+            # Next to the map rather than wherever the run was started from
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(image_filename)), self.MAP_CACHE_DIR)
+            cache_filename = os.path.join(cache_dir, f"{digest.hexdigest()}.npy")
+            if os.path.exists(cache_filename):
+                return np.load(cache_filename, mmap_mode="r")
+
+        from PIL import Image, ImageOps # only needed for image maps
         img = ImageOps.grayscale(Image.open(image_filename))
         img = img.resize((self.width, self.height))
-        pixels = np.array(img.getdata())
-
-        for i in range(len(pixels)):
-            if pixels[i] < 128:
-                pixels[i] = 0
-            else:
-                pixels[i] = 1
+        pixels = (np.asarray(img) >= 128).astype(np.uint8)
 
-        pixels = pixels.reshape((self.width,self.height))
+        if cache_filename is not None:
+            # Write to a temporary name first so concurrent runs never load a half-written grid
+            temp_filename = f"{cache_filename}.{os.getpid()}.tmp.npy"
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(temp_filename, pixels)
+                os.replace(temp_filename, cache_filename)
+            except OSError:
+                with contextlib.suppress(OSError):
+                    os.remove(temp_filename)
         return pixels
         
-
     def is_occupied(self, coords: tuple[int, int]) -> bool:
         return bool(self.occupancy_grid[*coords])
 
@@ -70,42 +183,179 @@ class Environment:
         update every agent's pdm to reflect what they encounter in this step
         """
 
-        agent_actions = [agent.get_next_action() for agent in self.agents]
-        for ix, (agent, action) in enumerate(zip(self.agents, agent_actions)):
+        self.agent_grid.rebuild(self.agents)
+        agent_actions = self.get_agent_actions()
+        if self.lookahead is not None:
+            self.lookahead.submit(self.agents, agent_actions)
+        obstacle_hits = self.find_obstacle_hits(agent_actions)
+        collisions = self.find_collisions(agent_actions)
+        outcomes = []
+        for agent, action, is_obstacle, is_collision in zip(self.agents, agent_actions, obstacle_hits, collisions):
             # action = agent.get_next_action()
 
-            is_collision = False
-            for jx, other_action in enumerate(agent_actions):
-                if ix == jx:
-                    continue
-                if action == other_action:
-                    is_collision = True
-
-            if self.is_occupied(action): # tried to do an action that results in constraint violation
+            if is_obstacle: # tried to do an action that results in constraint violation
                 self.fail += 1
+                self.obstacle_crashes += 1
                 print("Agent made a mistake, resetting to random position")
-                agent.take_step(coords=self.get_random_position(), success=False)
+                agent.take_step(coords=self.get_random_position(exclude_agents=self.respawn_avoids_agents), success=False)
+                outcomes.append(OUTCOME_OBSTACLE)
                 # agent.reset_for_failure()
             elif is_collision:
                 self.fail += 1
-                agent.take_step(coords=self.get_random_position(), success=True, neutral=True)
+                self.collisions += 1
+                agent.take_step(coords=self.get_random_position(exclude_agents=self.respawn_avoids_agents), success=True, neutral=True)
+                outcomes.append(OUTCOME_COLLISION)
             else: # all good all safe
                 agent.take_step(coords=action, success=True)
                 # agent.successful_move(action)
                 # agent.update_explored(action)
                 self.success += 1
+                outcomes.append(OUTCOME_SUCCESS)
             
             # print(agent.other_agents)
-        cohesive_map = self.get_cohesive_explored_map()
-        if not self.explored_enough(cohesive_map):
-            return
-        
-        for agent in self.agents:
-            print("goal completed")
-            agent.inform_goal_completed()
-        
-    def explored_enough(self, cohesive_map):
-        map_no_obstacles_size = np.count_nonzero(self.occupancy_grid == 0)
-        explored_frac = np.sum(cohesive_map) / map_no_obstacles_size
+
+        if self.recorder is not None:
+            self.recorder.record(self, outcomes)
+
+        if self.explored_enough():
+            for agent in self.agents:
+                print("goal completed")
+                agent.inform_goal_completed()
+
+        self.tick += 1
+        if self.metrics is not None:
+            self.metrics.record(self)
+        if self.checkpoint_every and self.tick % self.checkpoint_every == 0:
+            if self.checkpoint_path is None:
+                raise ValueError("checkpoint_every is set but checkpoint_path is not")
+            self.save_checkpoint(self.checkpoint_path)
+
+    def enable_checkpoints(self, path, every):
+        """
+        saves a checkpoint to path every this many ticks
+        """
+        if path is None:
+            raise ValueError("Periodic checkpoints need a path to save to")
+        if every < 1:
+            raise ValueError(f"every must be a positive number of ticks, got {every}")
+        self.checkpoint_path = path
+        self.checkpoint_every = every
+
+    def get_agent_actions(self):
+        return [agent.get_next_action() for agent in self.agents]
+
+    def find_obstacle_hits(self, agent_actions):
+        return [self.is_occupied(action) for action in agent_actions]
+
+    def find_collisions(self, agent_actions):
+        target_counts = Counter(agent_actions)
+        return [ target_counts[action] > 1 for action in agent_actions ]
+
+    def close(self):
+        """
+        stops any background workers - only needed with lookahead_workers
+        """
+        if self.lookahead is not None:
+            self.lookahead.close()
+
+    def explored_enough(self):
+        explored_frac = self.explored_count / self.free_cell_count
         # print(explored_frac)
         return explored_frac >= self.completion_percentage
+
+    def save_checkpoint(self, path):
+        """
+        writes the full simulation state - agents, counters, every random stream and any plans made a tick ahead - to a single binary file
+        maps loaded from a file are stored by path, others are stored whole
+        """
+        agent_class = self.agent_class
+        base_class = next(cls for cls in agent_class.__mro__ if getattr(importlib.import_module(cls.__module__), cls.__qualname__, None) is cls)
+        checkpoint = {
+            "environment_class": (type(self).__module__, type(self).__qualname__),
+            "agent_class": (base_class.__module__, base_class.__qualname__),
+            "agent_constants": { name: getattr(agent_class, name) for name in dir(agent_class) if name.isupper() },
+            "occupancy_source": self.occupancy_source,
+            "occupancy_grid": None if self.occupancy_source is not None else np.array(self.occupancy_grid),
+            "num_agents": len(self.agents),
+            "width": self.width,
+            "height": self.height,
+            "completion_percentage": self.completion_percentage,
+            "tile_size": self.tile_size,
+            "delta_sync": self.delta_sync,
+            "shared_frontier": self.shared_frontier,
+            "incremental_planning": self.incremental_planning,
+            "lookahead_workers": self.lookahead_workers,
+            "respawn_avoids_agents": self.respawn_avoids_agents,
+            "options": self.checkpoint_options(),
+            "seed": self.seed,
+            "tick": self.tick,
+            "success": self.success,
+            "fail": self.fail,
+            "collisions": self.collisions,
+            "obstacle_crashes": self.obstacle_crashes,
+            "cohesive_map": np.array(self.cohesive_map),
+            "explored_count": self.explored_count,
+            "agents": [ agent.get_state() for agent in self.agents ],
+            "lookahead": None if self.lookahead is None else self.lookahead.get_state(self.agents),
+            "peer_versions": [ { self.agents.index(peer): versions for peer, versions in agent.peer_versions.items() } for agent in self.agents ],
+            "rng": self.rng.get_state(),
+        }
+        # Write next to the target and swap it in, so an interrupted save never clobbers the last good checkpoint
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as checkpoint_file:
+            pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def checkpoint_options(self):
+        """
+        constructor keyword arguments a subclass adds, saved so load_checkpoint can pass them back
+        """
+        return {}
+
+    @staticmethod
+    def load_checkpoint(path):
+        """
+        rebuilds the environment saved by save_checkpoint, ready to carry on exactly where it stopped
+        """
+        with open(path, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+
+        module_name, class_name = checkpoint["environment_class"]
+        environment_class = getattr(importlib.import_module(module_name), class_name)
+        module_name, class_name = checkpoint["agent_class"]
+        agent_class = getattr(importlib.import_module(module_name), class_name)
+        overrides = { name: value for name, value in checkpoint["agent_constants"].items() if getattr(agent_class, name, None) != value }
+        if overrides:
+            agent_class = type(agent_class.__name__, (agent_class,), overrides)
+
+        occupancy_data = checkpoint["occupancy_source"] if checkpoint["occupancy_source"] is not None else checkpoint["occupancy_grid"]
+        environment = environment_class(
+            occupancy_data,
+            checkpoint["num_agents"],
+            checkpoint["width"],
+            checkpoint["height"],
+            checkpoint["completion_percentage"],
+            agent_class=agent_class,
+            **({ "tile_size": checkpoint["tile_size"] } if checkpoint.get("tile_size") else {}),
+            **({ "delta_sync": True } if checkpoint.get("delta_sync") else {}),
+            **({ "shared_frontier": True } if checkpoint.get("shared_frontier") else {}),
+            **({ "incremental_planning": True } if checkpoint.get("incremental_planning") else {}),
+            **({ "lookahead_workers": checkpoint["lookahead_workers"] } if checkpoint.get("lookahead_workers") else {}),
+            **checkpoint.get("options", {}),
+            seed=checkpoint.get("seed"),
+        )
+
+        for agent, agent_state, peer_versions in zip(environment.agents, checkpoint["agents"], checkpoint.get("peer_versions", [{}] * len(checkpoint["agents"]))):
+            agent.set_state(agent_state)
+            agent.peer_versions = { environment.agents[ix]: versions for ix, versions in peer_versions.items() }
+        environment.agent_grid.rebuild(environment.agents)
+        if environment.lookahead is not None and checkpoint.get("lookahead") is not None:
+            environment.lookahead.set_state(environment.agents, checkpoint["lookahead"])
+
+        environment.cohesive_map[...] = checkpoint["cohesive_map"]
+        for name in ("respawn_avoids_agents", "tick", "success", "fail", "collisions", "obstacle_crashes", "explored_count"):
+            setattr(environment, name, checkpoint[name])
+
+        # Constructing the environment drew spawn positions, so the stream goes back last
+        environment.rng.set_state(checkpoint["rng"])
+        return environment
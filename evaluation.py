@@ -1,9 +1,9 @@
 from environment import Environment
+from metrics import LivePlot, MetricsSink
+from runner import simulate
 from visualization import RobotVisualization
 from agent import Agent
 import numpy as np
-import matplotlib.pyplot as plt
-import cv2
 
 occupancy_data = np.zeros((30, 30))
 occupancy_data[20:25, :10] = 1
@@ -11,28 +11,15 @@ occupancy_data[5:10, 20:] = 1
 # occupancy_data[:10, 5:15] = 1
 # occupancy_data[20:, 15:25] = 1
 environment = Environment("manyobstacles.png", 2, 30, 30, 0.75)
+metrics = MetricsSink(path="metrics.csv").attach(environment)
 anim = RobotVisualization(environment)
-ratios = []
-for i in range(3000):
+plot = LivePlot(metrics, title='Multiagent Recovery RL on 30x30')
 
-    # print("Before environment update")
-    environment.update_pos()
-
-    if len(environment.agents) == 0:
-        print("agents ran out")
-        break
-    # print("Environment update")
+def on_tick(i, environment):
     anim.update(environment)
-    # print("After animation update")
-    ratios.append(environment.success/environment.fail)
-    print(i)
-
+    plot.update()
 
-x_vals = [i for i in range(len(ratios))]
-print(ratios)
-plt.plot(x_vals, ratios)
-plt.xlabel('Iterations')
-plt.ylabel('Ratio of Successes to Failures')
-plt.title('Multiagent Recovery RL on 30x30')
-plt.show()
-# anim.done()
\ No newline at end of file
+simulate(environment, 3000, on_tick=on_tick, history=False)
+metrics.close()
+plot.show()
+# anim.done()
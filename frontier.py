@@ -0,0 +1,164 @@
+import heapq
+import numpy as np
+
+def descend(distance, agent):
+    """
+    path down a distance field from the agent's position to a cell at distance 0, taking the safest step among
+    equally short ones the way the agent's search would - None if the agent's own cell has no finite distance
+    """
+    coords = agent.pos
+    remaining = distance[*coords]
+    if remaining <= 0:
+        return None
+
+    path = []
+    while remaining > 0:
+        remaining -= 1
+        coords = next(neighbor for neighbor in agent.possible_steps(coords) if distance[*neighbor] == remaining)
+        path.append(coords)
+    return path
+
+class FrontierField:
+    """
+    Distance from every cell to the nearest cell nobody on the team has explored yet, shared by all agents.
+    Agents move on an 8-connected grid without knowing where obstacles are, so this is the chessboard distance -
+    exactly the path length each agent's own breadth first search would find.
+    The field is recomputed lazily, at most once per change of the team's explored map.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.distance = None
+        self.explored_count = None # team explored count the field was computed for
+
+    def get_distance(self):
+        environment = self.environment
+        if self.explored_count != environment.explored_count:
+            from scipy.ndimage import distance_transform_cdt # only needed once a field is in use
+            # -1 everywhere once the whole grid has been explored
+            self.distance = distance_transform_cdt(environment.cohesive_map != 0, metric="chessboard")
+            self.explored_count = environment.explored_count
+        return self.distance
+
+    def trajectory_from(self, agent):
+        """
+        path down the distance gradient from the agent's position to the nearest unexplored cell, taking the
+        safest step among equally short ones the way the agent's search would
+        returns None if there is no unexplored cell, or if the one reached is near a goal the agent recently gave up on
+        """
+        path = descend(self.get_distance(), agent)
+        if path is None or agent.close_to_previous_goals(path[-1]):
+            return None
+        return path
+
+class GoalDistanceField:
+    """
+    One agent's distance from every cell to its nearest goal - a cell it has not explored that is not near a
+    recently abandoned goal - kept across replans in the spirit of LPA* / D* Lite.
+
+    The field is searched backwards from the goals, so the agent moving does not invalidate it. When the goal set
+    changes only the affected part is repaired: cells that relied on a removed goal are raised (invalidated, following
+    the chain of cells that relied on them) and the hole is then lowered again from its still valid border and from any
+    new goals, in distance order. If a repair would touch more than MAX_REPAIR_FRACTION of the grid it is cheaper to
+    recompute the whole field with the distance transform.
+    """
+
+    MAX_REPAIR_FRACTION = 0.05
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.unreachable = shape[0] * shape[1] + 1 # distance of every cell when there are no goals at all
+        self.goals = None # goal mask the field was last brought up to date with
+        self.distance = None
+        self.last_repaired = 0 # cells the last update touched
+
+    def current_goals(self, agent):
+        return ~(np.asarray(agent.explored) != 0) & ~np.asarray(agent.previous_goal_mask)
+
+    def recompute(self, goals):
+        from scipy.ndimage import distance_transform_cdt
+        distance = distance_transform_cdt(~goals, metric="chessboard").astype(np.int64)
+        distance[distance < 0] = self.unreachable
+        self.distance = distance
+        self.last_repaired = distance.size
+
+    def neighbors(self, r, c):
+        ROWS, COLS = self.shape
+        for nr in range(max(r - 1, 0), min(r + 2, ROWS)):
+            for nc in range(max(c - 1, 0), min(c + 2, COLS)):
+                if (nr, nc) != (r, c):
+                    yield nr, nc
+
+    def update(self, agent):
+        goals = self.current_goals(agent)
+        if self.goals is None:
+            self.goals = goals
+            self.recompute(goals)
+            return
+
+        changed = goals != self.goals
+        self.goals = goals
+        if not changed.any():
+            self.last_repaired = 0
+            return
+        if not self.repair(np.argwhere(changed & ~goals).tolist(), np.argwhere(changed & goals).tolist()):
+            self.recompute(goals)
+
+    def repair(self, removed, added):
+        """
+        returns False, leaving the field to be recomputed, if the repair outgrows MAX_REPAIR_FRACTION of the grid
+        """
+        distance, unreachable = self.distance, self.unreachable
+        limit = self.MAX_REPAIR_FRACTION * distance.size
+
+        # Raise: invalidate every cell whose distance has no support left
+        invalid = set()
+        stack = []
+        for r, c in removed:
+            invalid.add((r, c))
+            stack.append((r, c, int(distance[r, c])))
+            distance[r, c] = unreachable
+        while stack:
+            r, c, old_distance = stack.pop()
+            for nr, nc in self.neighbors(r, c):
+                if (nr, nc) in invalid or distance[nr, nc] != old_distance + 1:
+                    continue
+                supported = any(distance[sr, sc] == old_distance and (sr, sc) not in invalid for sr, sc in self.neighbors(nr, nc))
+                if not supported:
+                    invalid.add((nr, nc))
+                    stack.append((nr, nc, old_distance + 1))
+                    distance[nr, nc] = unreachable
+            if len(invalid) > limit:
+                return False
+
+        # Lower: refill from the valid border of the invalidated cells and from the new goals
+        queue = []
+        for r, c in invalid:
+            for nr, nc in self.neighbors(r, c):
+                if (nr, nc) not in invalid and distance[nr, nc] < unreachable:
+                    queue.append((int(distance[nr, nc]), nr, nc))
+        for r, c in added:
+            distance[r, c] = 0
+            queue.append((0, r, c))
+        heapq.heapify(queue)
+
+        repaired = 0
+        while queue:
+            d, r, c = heapq.heappop(queue)
+            if d > distance[r, c]:
+                continue
+            repaired += 1
+            for nr, nc in self.neighbors(r, c):
+                if d + 1 < distance[nr, nc]:
+                    distance[nr, nc] = d + 1
+                    heapq.heappush(queue, (d + 1, nr, nc))
+            if repaired > limit:
+                return False
+        self.last_repaired = len(invalid) + repaired
+        return True
+
+    def trajectory_from(self, agent):
+        self.update(agent)
+        if self.distance[*agent.pos] >= self.unreachable:
+            return None
+        return descend(self.distance, agent)
@@ -0,0 +1,100 @@
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from parallel import SharedSwarmState, plan_trajectory
+
+snapshots = None # the planner's SharedSwarmState, in each pool worker
+
+def attach_snapshots(swarm):
+    global snapshots
+    snapshots = swarm
+
+def plan_snapshot(index, pos):
+    return plan_trajectory(snapshots, index, pos)
+
+class LookaheadPlanner:
+    """
+    Plans agents' next trajectories a tick ahead on a process pool, so the searches run while the environment
+    is busy stepping agents instead of inside the next tick's decisions.
+
+    Right after the agents decide, every agent whose decision finished or invalidated its trajectory is known to
+    replan next tick, starting from the cell it is about to move to. If its last search expanded at least
+    MIN_EXPECTED_EXPANSION nodes, its maps are copied into its slot of a shared memory snapshot, with that cell marked
+    explored as a successful step would, and the search is submitted against the snapshot - smaller searches cost
+    less than handing them over and just run synchronously next tick. Next tick the result is claimed if it is
+    still valid - the agent stands where it was planned from, has abandoned no goal since, and the goal is still
+    unexplored, which makes it a shortest path to a goal. Otherwise the agent plans synchronously as usual.
+    A claimed plan can differ from the synchronous one only in which of several equally short paths it picks.
+    """
+
+    MIN_EXPECTED_EXPANSION = 512
+
+    def __init__(self, num_workers, num_agents, shape):
+        self.snapshots = SharedSwarmState(num_agents, shape)
+        self.pool = ProcessPoolExecutor(max_workers=num_workers, initializer=attach_snapshots, initargs=(self.snapshots,))
+        # Shuts the pool down even if close() is never called - the snapshots clean up after themselves
+        self.finalizer = weakref.finalize(self, self.pool.shutdown, cancel_futures=True)
+        self.pending = {} # agent -> (start coords, previous goals, future)
+        self.submitted = {} # snapshot slot -> the last search submitted against it
+        self.claimed = 0
+        self.rejected = 0
+
+    def will_replan(self, agent):
+        return not agent.goal_satisfied and (agent.trajectory is None or agent.trajectory_step >= len(agent.trajectory))
+
+    def submit(self, agents, agent_actions):
+        snapshots = self.snapshots
+        for index, (agent, action) in enumerate(zip(agents, agent_actions)):
+            if agent.last_search_expanded < self.MIN_EXPECTED_EXPANSION or not self.will_replan(agent):
+                continue
+            last = self.submitted.get(index)
+            if last is not None and not last.cancel():
+                last.result() # a worker may still be reading this agent's slot - skipping instead would depend on timing
+            snapshots.pdms[index] = agent.pdm
+            snapshots.explored[index] = agent.explored
+            snapshots.explored[index][*action] = True
+            snapshots.goal_masks[index] = agent.previous_goal_mask
+            future = self.submitted[index] = self.pool.submit(plan_snapshot, index, action)
+            self.pending[agent] = (action, list(agent.previous_goals), future)
+
+    def claim(self, agent):
+        """
+        the trajectory planned ahead for the agent if it is still valid, else None
+        """
+        pending = self.pending.pop(agent, None)
+        if pending is None:
+            return None
+        start, previous_goals, future = pending
+        if agent.pos != start or agent.previous_goals != previous_goals:
+            future.cancel()
+            self.rejected += 1
+            return None
+
+        trajectory, expanded = future.result()
+        if trajectory is None or agent.explored[*trajectory[-1]]:
+            self.rejected += 1
+            return None
+        agent.last_search_expanded = expanded
+        self.claimed += 1
+        return trajectory
+
+    def get_state(self, agents):
+        """
+        the pending plans, keyed by agent index, with their searches waited for so they can be pickled
+        """
+        pending = { agents.index(agent): (start, list(previous_goals), future.result()) for agent, (start, previous_goals, future) in self.pending.items() }
+        return { "pending": pending, "claimed": self.claimed, "rejected": self.rejected }
+
+    def set_state(self, agents, state):
+        self.pending = {}
+        for index, (start, previous_goals, result) in state["pending"].items():
+            future = Future()
+            future.set_result(result)
+            self.pending[agents[index]] = (start, list(previous_goals), future)
+        self.claimed = state["claimed"]
+        self.rejected = state["rejected"]
+
+    def close(self):
+        self.pending = {}
+        self.submitted = {}
+        self.finalizer()
+        self.snapshots.close()
@@ -0,0 +1,186 @@
+import sys
+import time
+import numpy as np
+
+METRIC_DTYPE = np.dtype([
+    ("tick", "<i8"),
+    ("success", "<i8"),
+    ("fail", "<i8"),
+    ("ratio", "<f8"), # success / fail so far
+    ("explored_fraction", "<f8"),
+    ("collisions", "<i8"), # during this tick
+    ("obstacle_crashes", "<i8"), # during this tick
+    ("recoveries", "<i8"), # during this tick
+])
+
+class MetricsSink:
+    """
+    Streaming per-tick metrics for an Environment, with memory and I/O that stay flat however long the run is.
+
+    The last capacity ticks live in a ring buffer that rolling statistics over the last window ticks are read from.
+    With a path, rows are appended to it as CSV in batches of flush_every ticks, and a one-line summary is printed
+    at most every print_interval seconds (None turns it off).
+    attach() it to an environment and it is fed every tick.
+    """
+
+    def __init__(self, capacity=10000, window=100, path=None, flush_every=1000, print_interval=1.0, stream=sys.stdout):
+        if path is not None and flush_every > capacity:
+            raise ValueError("flush_every must not exceed capacity, or rows would be overwritten before they are written")
+        self.capacity = capacity
+        self.window = window
+        self.path = path
+        self.flush_every = flush_every
+        self.print_interval = print_interval
+        self.stream = stream
+
+        self.ring = np.zeros(capacity, dtype=METRIC_DTYPE)
+        self.count = 0 # ticks recorded so far
+        self.flushed = 0 # ticks written to path so far
+        self.last_print = 0.0
+        self.seen = (0, 0, 0) # environment totals as of the previous tick
+
+        if path is not None:
+            with open(path, "w") as metrics_file:
+                metrics_file.write(",".join(METRIC_DTYPE.names) + "\n")
+
+    def attach(self, environment):
+        environment.metrics = self
+        self.seen = self.totals(environment)
+        return self
+
+    def totals(self, environment):
+        return environment.collisions, environment.obstacle_crashes, sum(agent.recoveries for agent in environment.agents)
+
+    def record(self, environment):
+        totals = self.totals(environment)
+        seen, self.seen = self.seen, totals
+
+        row = self.ring[self.count % self.capacity]
+        row["tick"] = environment.tick
+        row["success"] = environment.success
+        row["fail"] = environment.fail
+        row["ratio"] = environment.success / environment.fail
+        row["explored_fraction"] = environment.explored_count / environment.free_cell_count
+        row["collisions"], row["obstacle_crashes"], row["recoveries"] = (total - before for total, before in zip(totals, seen))
+        self.count += 1
+
+        if self.path is not None and self.count - self.flushed >= self.flush_every:
+            self.flush()
+        if self.print_interval is not None:
+            now = time.monotonic()
+            if now - self.last_print >= self.print_interval:
+                self.last_print = now
+                print(self.format_summary(), file=self.stream)
+
+    def last(self, n):
+        """
+        the most recent n rows (at most capacity), oldest first
+        """
+        n = min(n, self.count, self.capacity)
+        end = self.count % self.capacity
+        if n <= end:
+            return self.ring[end - n:end]
+        return np.concatenate([self.ring[self.capacity - (n - end):], self.ring[:end]])
+
+    def rolling(self):
+        """
+        statistics over the last window ticks
+        """
+        rows = self.last(self.window)
+        if len(rows) == 0:
+            return {}
+        return {
+            "tick": int(rows["tick"][-1]),
+            "ratio": float(rows["ratio"][-1]),
+            "explored_fraction": float(rows["explored_fraction"][-1]),
+            "window_ticks": len(rows),
+            "window_collisions": int(rows["collisions"].sum()),
+            "window_obstacle_crashes": int(rows["obstacle_crashes"].sum()),
+            "window_recoveries": int(rows["recoveries"].sum()),
+        }
+
+    def format_summary(self):
+        stats = self.rolling()
+        return (
+            f"tick {stats['tick']}: ratio {stats['ratio']:.2f}, {stats['explored_fraction']:.1%} explored, last {stats['window_ticks']} ticks: "
+            f"{stats['window_collisions']} collisions, {stats['window_obstacle_crashes']} crashes, {stats['window_recoveries']} recoveries"
+        )
+
+    def flush(self):
+        if self.path is None or self.count == self.flushed:
+            return
+        rows = self.last(self.count - self.flushed)
+        with open(self.path, "a") as metrics_file:
+            np.savetxt(metrics_file, rows, fmt=["%d", "%d", "%d", "%.6g", "%.6g", "%d", "%d", "%d"], delimiter=",")
+        self.flushed = self.count
+
+    def close(self):
+        self.flush()
+
+class LivePlot:
+    """
+    Success/fail ratio and explored fraction from a MetricsSink, redrawn every update_every ticks by blitting only
+    the two lines onto a cached background. The axes are rescaled (a full redraw) only when the data outgrows them.
+    """
+
+    def __init__(self, sink, update_every=10, title="Multiagent Recovery RL"):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self.sink = sink
+        self.update_every = update_every
+
+        plt.ion()
+        self.figure, (self.ratio_axes, self.explored_axes) = plt.subplots(2, 1, sharex=True)
+        self.ratio_axes.set_title(title)
+        self.ratio_axes.set_ylabel("Ratio of Successes to Failures")
+        self.explored_axes.set_ylabel("Explored fraction")
+        self.explored_axes.set_xlabel("Iterations")
+        self.explored_axes.set_ylim(0, 1)
+        self.ratio_axes.set_xlim(0, 100)
+        self.ratio_axes.set_ylim(0, 1)
+
+        (self.ratio_line,) = self.ratio_axes.plot([], [], animated=True)
+        (self.explored_line,) = self.explored_axes.plot([], [], animated=True)
+        self.figure.canvas.mpl_connect("draw_event", self.on_draw)
+        self.background = None
+        plt.show(block=False)
+        self.figure.canvas.draw()
+
+    def show(self):
+        """
+        blocks with the final plot on screen
+        """
+        self.plt.ioff()
+        self.figure.canvas.draw()
+        self.plt.show()
+
+    def on_draw(self, event):
+        self.background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        self.ratio_axes.draw_artist(self.ratio_line)
+        self.explored_axes.draw_artist(self.explored_line)
+
+    def update(self):
+        sink = self.sink
+        if sink.count == 0 or sink.count % self.update_every:
+            return
+        rows = sink.last(sink.capacity)
+        ticks = rows["tick"]
+        self.ratio_line.set_data(ticks, rows["ratio"])
+        self.explored_line.set_data(ticks, rows["explored_fraction"])
+
+        canvas = self.figure.canvas
+        x_min, x_max = self.ratio_axes.get_xlim()
+        y_max = self.ratio_axes.get_ylim()[1]
+        if ticks[-1] > x_max or ticks[0] > x_min + (x_max - x_min) / 2 or rows["ratio"].max() > y_max:
+            # Outgrew the axes - rescale with headroom and redraw everything once, which recaches the background
+            self.ratio_axes.set_xlim(ticks[0], ticks[0] + 2 * max(ticks[-1] - ticks[0], 50))
+            self.ratio_axes.set_ylim(0, 1.5 * rows["ratio"].max())
+            canvas.draw()
+        elif self.background is not None:
+            canvas.restore_region(self.background)
+            self.draw_lines()
+            canvas.blit(self.figure.bbox)
+        canvas.flush_events()
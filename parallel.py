@@ -0,0 +1,180 @@
+import heapq
+import multiprocessing
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+from agent import plan_on_maps
+from swarm import SwarmAgent, SwarmEnvironment, SwarmState
+
+def release_blocks(blocks, unlink):
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            pass # something still holds a view onto it - the mapping goes away with the process
+        if unlink:
+            block.unlink()
+
+def stop_workers(connections, workers):
+    for connection in connections:
+        try:
+            connection.send(None)
+        except OSError:
+            pass # the worker is already gone
+        connection.close()
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+
+class SharedSwarmState(SwarmState):
+    """
+    SwarmState whose stacked arrays live in shared memory, so worker processes see every agent's maps
+    without copying them
+    """
+
+    def __init__(self, num_agents, shape, initial_pdm_value=0.4):
+        self.shape = shape
+        self.owner = True # only the process that created the blocks unlinks them
+        self.blocks = {}
+        self.pdms = self.shared_array("pdms", (num_agents, *shape), float, initial_pdm_value)
+        self.explored = self.shared_array("explored", (num_agents, *shape), bool, False)
+        self.goal_masks = self.shared_array("goal_masks", (num_agents, *shape), bool, False)
+        self.known_obstacles = self.shared_array("known_obstacles", (num_agents, *shape), bool, False)
+        self.positions = self.shared_array("positions", (num_agents, 2), np.int64, 0)
+        # Unlinks the blocks even if close() is never called, e.g. when a run dies with an exception
+        self.finalizer = weakref.finalize(self, release_blocks, [ block for block, _, _ in self.blocks.values() ], True)
+
+    def shared_array(self, name, shape, dtype, fill):
+        dtype = np.dtype(dtype)
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        self.blocks[name] = (block, shape, dtype)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array[...] = fill
+        return array
+
+    def __getstate__(self):
+        # Only reached with the spawn start method - forked workers inherit the mappings as they are
+        return { "shape": self.shape, "blocks": { name: (block.name, shape, dtype) for name, (block, shape, dtype) in self.blocks.items() } }
+
+    def __setstate__(self, state):
+        self.shape = state["shape"]
+        self.owner = False
+        self.blocks = {}
+        for name, (block_name, shape, dtype) in state["blocks"].items():
+            block = shared_memory.SharedMemory(name=block_name)
+            self.blocks[name] = (block, shape, dtype)
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+        self.finalizer = weakref.finalize(self, release_blocks, [ block for block, _, _ in self.blocks.values() ], False)
+
+    def close(self):
+        for name in list(self.blocks):
+            setattr(self, name, None) # drop the views before the buffers go away
+        self.blocks = {}
+        self.finalizer()
+
+def plan_trajectory(swarm, index, pos):
+    """
+    the agent's breadth first search, run against its maps in shared memory
+    """
+    return plan_on_maps(pos, swarm.pdms[index], swarm.explored[index], swarm.goal_masks[index])
+
+def planner_worker(swarm, connection):
+    while True:
+        jobs = connection.recv()
+        if jobs is None:
+            break
+        connection.send([ plan_trajectory(swarm, index, pos) for index, pos in jobs ])
+    connection.close()
+
+class ParallelSwarmAgent(SwarmAgent):
+    """
+    SwarmAgent that takes its next trajectory from a planner worker when one was planned for it this tick
+    """
+
+    def __init__(self, swarm, index, initial_coords=(0, 0), rng=None):
+        super().__init__(swarm, index, initial_coords=initial_coords, rng=rng)
+        self.planned_trajectory = None # (position it was planned from, trajectory, nodes expanded)
+
+    def needs_new_trajectory(self):
+        # Same test task_policy makes before it replans
+        return not self.goal_satisfied and (self.trajectory is None or self.trajectory_step >= len(self.trajectory))
+
+    def get_new_trajectory(self):
+        planned, self.planned_trajectory = self.planned_trajectory, None
+        if planned is None or planned[0] != self.pos:
+            return super().get_new_trajectory()
+        _, trajectory, self.last_search_expanded = planned
+        return trajectory
+
+class ParallelSwarmEnvironment(SwarmEnvironment):
+    """
+    SwarmEnvironment that plans trajectories in parallel on num_workers worker processes.
+    Each tick the agents that are about to replan are spread over the workers by expected search size, and the
+    breadth first searches run there in parallel against the shared memory maps. Everything that draws random
+    numbers or depends on the order agents act in - safety checks, recovery, collisions, respawns and fusion -
+    stays in this process and runs in agent order, so success/fail counts match Environment exactly.
+    Handing searches over costs a round trip per worker per tick, so this only has a chance of beating Environment
+    with several cores and searches of thousands of nodes - compare them with benchmark.py --parallel-workers.
+    Call close() (or use it as a context manager) to stop the workers and free the shared memory.
+    """
+
+    def __init__(self, occupancy_data: str | np.ndarray, num_agents, width, height, completion_percentage, agent_class=ParallelSwarmAgent, num_workers=None, **environment_args):
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+        super().__init__(occupancy_data, num_agents, width, height, completion_percentage, agent_class=agent_class, **environment_args)
+
+        self.workers = []
+        self.connections = []
+        for _ in range(self.num_workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=planner_worker, args=(self.swarm, worker_connection), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self.workers.append(worker)
+            self.connections.append(connection)
+        # Stops the workers even if close() is never called
+        self.worker_finalizer = weakref.finalize(self, stop_workers, self.connections, self.workers)
+
+    def make_swarm_state(self, num_agents, shape):
+        return SharedSwarmState(num_agents, shape)
+
+    def assign_jobs(self, agents):
+        """
+        spreads the agents' searches over the workers, largest first, each to the worker with the least work so far
+        an agent's last search size is the estimate for its next one, so fresh agents are dealt out round robin
+        """
+        jobs = [ [] for _ in range(self.num_workers) ]
+        loads = [ (0, worker) for worker in range(self.num_workers) ]
+        for agent in sorted(agents, key=lambda agent: agent.last_search_expanded, reverse=True):
+            load, worker = heapq.heappop(loads)
+            jobs[worker].append((agent.index, agent.pos))
+            heapq.heappush(loads, (load + max(agent.last_search_expanded, 1), worker))
+        return jobs
+
+    def plan_in_workers(self):
+        if self.shared_frontier or self.incremental_planning:
+            return # reading paths off a distance field is cheap enough to stay here
+        jobs = self.assign_jobs([ agent for agent in self.agents if agent.needs_new_trajectory() ])
+
+        busy = [ (connection, worker_jobs) for connection, worker_jobs in zip(self.connections, jobs) if worker_jobs ]
+        for connection, worker_jobs in busy:
+            connection.send(worker_jobs)
+        for connection, worker_jobs in busy:
+            for (index, pos), (trajectory, expanded) in zip(worker_jobs, connection.recv()):
+                self.agents[index].planned_trajectory = (pos, trajectory, expanded)
+
+    def get_agent_actions(self):
+        self.plan_in_workers()
+        return super().get_agent_actions()
+
+    def close(self):
+        self.worker_finalizer()
+        self.workers, self.connections = [], []
+        self.swarm.close()
+        super().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from collections import defaultdict
+from functools import wraps
+
+class TickProfiler:
+    """
+    Opt-in per-tick instrumentation. attach() wraps the environment's and agents' hot methods on the instances
+    themselves, so an environment that was never attached runs the plain methods with no overhead at all.
+
+    Phases (wall time): tick, decide, plan, safety, recovery, step, fusion, completion, render
+    Phases nest - plan, safety and recovery run inside decide, fusion inside step, and all but render inside tick
+    Events: ticks, replans, bfs_nodes_expanded, recovery_steps, safety_checks, fusion_contacts, collisions, obstacle_crashes
+
+    Every summary_every ticks a summary of the window is appended to jsonl_path and the cumulative totals are
+    written to prometheus_path in the Prometheus textfile format.
+    """
+
+    METRIC_PREFIX = "mrrl"
+
+    def __init__(self, summary_every=100, jsonl_path=None, prometheus_path=None):
+        self.summary_every = summary_every
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+
+        self.phase_seconds = defaultdict(float)
+        self.events = defaultdict(int)
+        self.total_phase_seconds = defaultdict(float)
+        self.total_events = defaultdict(int)
+        self.window_start_tick = 0
+
+        self.environment = None
+        self.wrapped = [] # (object, attribute name) pairs to remove on detach
+        self.seen_collisions = 0
+        self.seen_obstacle_crashes = 0
+
+    def count(self, event, amount=1):
+        self.events[event] += amount
+
+    def timed(self, phase, func, on_return=None):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.phase_seconds[phase] += time.perf_counter() - start
+            if on_return is not None:
+                on_return(result)
+            return result
+        return wrapper
+
+    def wrap(self, obj, name, phase, on_return=None):
+        setattr(obj, name, self.timed(phase, getattr(obj, name), on_return))
+        self.wrapped.append((obj, name))
+
+    def attach(self, environment):
+        self.environment = environment
+        environment.profiler = self
+        self.seen_collisions = environment.collisions
+        self.seen_obstacle_crashes = environment.obstacle_crashes
+
+        self.wrap(environment, "update_pos", "tick", on_return=lambda _: self.end_tick())
+        self.wrap(environment, "get_agent_actions", "decide")
+        self.wrap(environment, "explored_enough", "completion")
+        for agent in environment.agents:
+            self.attach_agent(agent)
+        return self
+
+    def attach_agent(self, agent):
+        def on_replan(_, agent=agent):
+            self.count("replans")
+            self.count("bfs_nodes_expanded", agent.last_search_expanded)
+
+        def on_fusion(_, agent=agent):
+            self.count("fusion_contacts", len(agent.get_available_agents()))
+
+        self.wrap(agent, "get_new_trajectory", "plan", on_return=on_replan)
+        self.wrap(agent, "is_safe", "safety", on_return=lambda _: self.count("safety_checks"))
+        self.wrap(agent, "recovery_step", "recovery", on_return=lambda _: self.count("recovery_steps"))
+        self.wrap(agent, "take_step", "step")
+        self.wrap(agent, "update_others_danger", "fusion", on_return=on_fusion)
+
+    def attach_visualization(self, visualization):
+        self.wrap(visualization, "update", "render")
+        return self
+
+    def detach(self):
+        for obj, name in self.wrapped:
+            delattr(obj, name) # falls back to the class method
+        self.wrapped = []
+        if self.environment is not None:
+            self.environment.profiler = None
+            self.environment = None
+
+    def end_tick(self):
+        self.count("ticks")
+        environment = self.environment
+        self.count("collisions", environment.collisions - self.seen_collisions)
+        self.count("obstacle_crashes", environment.obstacle_crashes - self.seen_obstacle_crashes)
+        self.seen_collisions, self.seen_obstacle_crashes = environment.collisions, environment.obstacle_crashes
+        if self.summary_every and self.events["ticks"] >= self.summary_every:
+            self.flush()
+
+    def summary(self):
+        ticks = self.events["ticks"]
+        return {
+            "time": time.time(),
+            "start_tick": self.window_start_tick,
+            "ticks": ticks,
+            "phase_seconds": dict(self.phase_seconds),
+            "phase_ms_per_tick": { phase: 1000 * seconds / ticks for phase, seconds in self.phase_seconds.items() } if ticks else {},
+            "events": dict(self.events),
+        }
+
+    def flush(self):
+        """
+        emits the current window and folds it into the running totals
+        """
+        summary = self.summary()
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, "a") as jsonl_file:
+                jsonl_file.write(json.dumps(summary) + "\n")
+
+        for phase, seconds in self.phase_seconds.items():
+            self.total_phase_seconds[phase] += seconds
+        for event, amount in self.events.items():
+            self.total_events[event] += amount
+        self.window_start_tick += self.events["ticks"]
+        self.phase_seconds = defaultdict(float)
+        self.events = defaultdict(int)
+
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
+        return summary
+
+    def prometheus_text(self):
+        prefix = self.METRIC_PREFIX
+        lines = [
+            f"# HELP {prefix}_phase_seconds_total Wall time spent in each simulation phase.",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        lines += [ f'{prefix}_phase_seconds_total{{phase="{phase}"}} {seconds:.6f}' for phase, seconds in sorted(self.total_phase_seconds.items()) ]
+        lines += [
+            f"# HELP {prefix}_events_total Simulation events counted by the profiler.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        lines += [ f'{prefix}_events_total{{event="{event}"}} {amount}' for event, amount in sorted(self.total_events.items()) ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # node_exporter may read the file at any moment, so replace it in one step
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as prometheus_file:
+            prometheus_file.write(self.prometheus_text())
+        os.replace(temp_path, path)
@@ -0,0 +1,66 @@
+import numpy as np
+
+# Action outcomes recorded for each agent on each tick
+OUTCOME_SUCCESS = 0
+OUTCOME_OBSTACLE = 1 # moved into an obstacle and was reset to a random position
+OUTCOME_COLLISION = 2 # picked the same cell as another agent and was reset to a random position
+
+MAGIC = b"MRRLTRJ1"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("num_agents", "<u4"), ("height", "<u4"), ("width", "<u4"), ("pdm_every", "<u4")])
+
+def tick_dtype(num_agents):
+    return np.dtype([("positions", "<i4", (num_agents, 2)), ("outcomes", "u1", (num_agents,))])
+
+def snapshot_dtype(num_agents, shape):
+    return np.dtype([("tick", "<i8"), ("pdms", "<f4", (num_agents, *shape))])
+
+def snapshot_path(path):
+    return str(path) + ".pdm"
+
+class TrajectoryRecorder:
+    """
+    Appends one fixed-size record per tick (agent positions and action outcomes) to a binary file,
+    after a header and the occupancy grid, so the whole run can be memory-mapped back with TrajectoryReader.
+    Every pdm_every ticks (0 disables it) all agents' pdms are appended as float32 to a sidecar .pdm file.
+    """
+
+    def __init__(self, path, environment, pdm_every=0):
+        self.path = path
+        self.num_agents = len(environment.agents)
+        self.shape = environment.occupancy_grid.shape
+        self.pdm_every = pdm_every
+        self.tick = 0
+
+        self.tick_dtype = tick_dtype(self.num_agents)
+        self.snapshot_dtype = snapshot_dtype(self.num_agents, self.shape)
+
+        header = np.array([(MAGIC, self.num_agents, self.shape[0], self.shape[1], pdm_every)], dtype=HEADER_DTYPE)
+        self.file = open(path, "wb")
+        self.file.write(header.tobytes())
+        self.file.write(np.asarray(environment.occupancy_grid, dtype=np.uint8).tobytes())
+
+        self.snapshot_file = open(snapshot_path(path), "wb") if pdm_every else None
+
+    def record(self, environment, outcomes):
+        record = np.zeros(1, dtype=self.tick_dtype)
+        record["positions"][0] = [ agent.pos for agent in environment.agents ]
+        record["outcomes"][0] = outcomes
+        self.file.write(record.tobytes())
+
+        if self.snapshot_file is not None and self.tick % self.pdm_every == 0:
+            snapshot = np.zeros(1, dtype=self.snapshot_dtype)
+            snapshot["tick"][0] = self.tick
+            snapshot["pdms"][0] = [ agent.pdm for agent in environment.agents ]
+            self.snapshot_file.write(snapshot.tobytes())
+
+        self.tick += 1
+
+    def flush(self):
+        self.file.flush()
+        if self.snapshot_file is not None:
+            self.snapshot_file.flush()
+
+    def close(self):
+        self.file.close()
+        if self.snapshot_file is not None:
+            self.snapshot_file.close()
@@ -0,0 +1,129 @@
+import argparse
+import os
+import numpy as np
+from PIL import Image
+from colors import AGENT_RGB, OTHER_AGENT_RGB, OBSTACLE_RGB, color_codes_to_rgb, pdm_color_codes
+from recorder import HEADER_DTYPE, MAGIC, snapshot_dtype, snapshot_path, tick_dtype
+
+PANEL_GAP = 1 # cells between the two panels
+
+class TrajectoryReader:
+    """
+    Memory-maps a file written by TrajectoryRecorder (and its .pdm sidecar if there is one)
+    """
+
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"{path} is not a trajectory recording")
+        self.num_agents = int(header["num_agents"])
+        self.shape = (int(header["height"]), int(header["width"]))
+        self.pdm_every = int(header["pdm_every"])
+
+        grid_offset = HEADER_DTYPE.itemsize
+        self.occupancy_grid = np.memmap(path, dtype=np.uint8, mode="r", offset=grid_offset, shape=self.shape)
+
+        records_offset = grid_offset + self.occupancy_grid.size
+        record_dtype = tick_dtype(self.num_agents)
+        num_ticks = (os.path.getsize(path) - records_offset) // record_dtype.itemsize
+        self.ticks = np.memmap(path, dtype=record_dtype, mode="r", offset=records_offset, shape=(num_ticks,)) if num_ticks else np.zeros(0, dtype=record_dtype)
+
+        self.snapshots = None
+        pdm_path = snapshot_path(path)
+        if self.pdm_every and os.path.exists(pdm_path):
+            pdm_dtype = snapshot_dtype(self.num_agents, self.shape)
+            num_snapshots = os.path.getsize(pdm_path) // pdm_dtype.itemsize
+            if num_snapshots:
+                self.snapshots = np.memmap(pdm_path, dtype=pdm_dtype, mode="r", shape=(num_snapshots,))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def positions(self, tick):
+        return self.ticks["positions"][tick]
+
+    def outcomes(self, tick):
+        return self.ticks["outcomes"][tick]
+
+    def pdms_at(self, tick):
+        "Most recent pdm snapshot taken at or before tick, or None if there is none."
+        if self.snapshots is None:
+            return None
+        ix = np.searchsorted(self.snapshots["tick"], tick, side="right") - 1
+        if ix < 0:
+            return None
+        return self.snapshots["pdms"][ix]
+
+def render_panel(reader, tick, agent_ix, pdms):
+    obstacles = reader.occupancy_grid.astype(bool)
+    if pdms is None:
+        # No snapshot yet - free cells are black like the live view before its first update
+        rgb = np.zeros((*reader.shape, 3), dtype=np.uint8)
+        rgb[obstacles] = OBSTACLE_RGB
+    else:
+        rgb = color_codes_to_rgb(pdm_color_codes(pdms[agent_ix], obstacles))
+
+    for other_ix, (r, c) in enumerate(reader.positions(tick)):
+        rgb[r, c] = AGENT_RGB if other_ix == agent_ix else OTHER_AGENT_RGB
+
+    # Same orientation as RobotVisualization: the first index runs left to right, the second bottom to top
+    return np.flipud(rgb.transpose(1, 0, 2))
+
+def render_frame(reader, tick, scale=8):
+    """
+    rasterizes a tick the way RobotVisualization draws it: one panel per agent for the first two agents
+    """
+    pdms = reader.pdms_at(tick)
+    panels = [ render_panel(reader, tick, agent_ix, pdms) for agent_ix in range(min(reader.num_agents, 2)) ]
+    if len(panels) == 2:
+        gap = np.zeros((panels[0].shape[0], PANEL_GAP, 3), dtype=np.uint8)
+        frame = np.concatenate([panels[0], gap, panels[1]], axis=1)
+    else:
+        frame = panels[0]
+    return frame.repeat(scale, axis=0).repeat(scale, axis=1)
+
+def frames(reader, start=0, stop=None, step=1, scale=8):
+    for tick in range(start, len(reader) if stop is None else stop, step):
+        yield render_frame(reader, tick, scale=scale)
+
+def export_images(reader, directory, **frame_args):
+    os.makedirs(directory, exist_ok=True)
+    for ix, frame in enumerate(frames(reader, **frame_args)):
+        Image.fromarray(frame).save(os.path.join(directory, f"frame_{ix:06d}.png"))
+
+def export_video(reader, path, fps=30, **frame_args):
+    """
+    writes an animated GIF with PIL, or any other container through OpenCV
+    """
+    if path.lower().endswith(".gif"):
+        images = [ Image.fromarray(frame) for frame in frames(reader, **frame_args) ]
+        images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0)
+        return
+
+    import cv2
+    writer = None
+    for frame in frames(reader, **frame_args):
+        if writer is None:
+            height, width = frame.shape[:2]
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    if writer is not None:
+        writer.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded run headlessly to images or a video")
+    parser.add_argument("recording", help="file written by TrajectoryRecorder")
+    parser.add_argument("output", help="directory for a PNG sequence, or a .gif/.mp4 path")
+    parser.add_argument("--scale", type=int, default=8, help="pixels per grid cell")
+    parser.add_argument("--step", type=int, default=1, help="render every step-th tick")
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+
+    reader = TrajectoryReader(args.recording)
+    if os.path.splitext(args.output)[1]:
+        export_video(reader, args.output, fps=args.fps, scale=args.scale, step=args.step)
+    else:
+        export_images(reader, args.output, scale=args.scale, step=args.step)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+
+def default_seed():
+    """
+    seed for a stream nobody seeded explicitly - drawn from NumPy's global RNG, so np.random.seed still makes
+    such runs reproducible
+    """
+    return int(np.random.randint(0, 2 ** 31))
+
+class RandomStream:
+    """
+    Seedable source of the simulation's random draws, backed by a NumPy Generator.
+    Uniform floats are generated block_size at a time and handed out one by one, so a hot path pays for a list
+    lookup instead of an RNG call.
+    """
+
+    def __init__(self, seed=None, block_size=1024):
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.block = []
+        self.index = 0
+
+    def random(self):
+        """
+        uniform float in [0, 1)
+        """
+        if self.index == len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.index = 0
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+    def randrange(self, n):
+        return min(int(self.random() * n), n - 1)
+
+    def choice(self, seq):
+        return seq[self.randrange(len(seq))]
+
+    def get_state(self):
+        return { "generator": self.generator.bit_generator.state, "block": list(self.block), "index": self.index }
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state["generator"]
+        self.block = list(state["block"])
+        self.index = state["index"]
+
+def spawn_streams(seed, count, block_size=1024):
+    """
+    count independent streams derived from one seed (a fresh one from default_seed if it is None)
+    """
+    seed_sequence = np.random.SeedSequence(default_seed() if seed is None else seed)
+    return [ RandomStream(child, block_size=block_size) for child in seed_sequence.spawn(count) ]
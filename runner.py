@@ -0,0 +1,128 @@
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from agent import Agent
+from environment import Environment
+
+# One row per run in runs.csv - the per-tick series live in that run's series file
+RUN_COLUMNS = ["run_id", "map", "num_agents", "width", "height", "completion_percentage", "agent_constants", "seed", "ticks", "success", "fail", "series"]
+
+def simulate(environment, iterations, on_tick=None, history=True):
+    """
+    steps the environment for the given number of iterations
+    returns the success and fail counts after every tick - empty lists without history, for runs that stream
+    their metrics elsewhere
+    """
+    successes, fails = [], []
+    for i in range(iterations):
+        environment.update_pos()
+        if len(environment.agents) == 0:
+            break
+        if history:
+            successes.append(environment.success)
+            fails.append(environment.fail)
+        if on_tick is not None:
+            on_tick(i, environment)
+    return successes, fails
+
+def expand_sweep(maps, agent_counts, completion_percentages, seeds, width=30, height=30, iterations=3000, agent_constants=({},)):
+    """
+    one run per combination of map, agent count, completion percentage, Agent constant overrides and seed
+    """
+    runs = []
+    combinations = itertools.product(maps, agent_counts, completion_percentages, agent_constants, seeds)
+    for run_id, (occupancy_map, num_agents, completion_percentage, constants, seed) in enumerate(combinations):
+        runs.append({
+            "run_id": run_id,
+            "map": occupancy_map,
+            "num_agents": num_agents,
+            "width": width,
+            "height": height,
+            "completion_percentage": completion_percentage,
+            "agent_constants": dict(constants),
+            "seed": seed,
+            "iterations": iterations,
+        })
+    return runs
+
+def make_agent_class(agent_constants, base_class=Agent):
+    if not agent_constants:
+        return base_class
+    unknown = [ name for name in agent_constants if not hasattr(base_class, name) ]
+    if unknown:
+        raise ValueError(f"Unknown Agent constants: {unknown}")
+    return type(base_class.__name__, (base_class,), dict(agent_constants))
+
+def run_single(run):
+    """
+    runs one configuration headlessly - every random draw comes from streams seeded by the run's seed,
+    so a run gives the same result in any worker
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        environment = Environment(
+            occupancy_data=run["map"],
+            num_agents=run["num_agents"],
+            width=run["width"],
+            height=run["height"],
+            completion_percentage=run["completion_percentage"],
+            agent_class=make_agent_class(run["agent_constants"]),
+            seed=run["seed"],
+        )
+        successes, fails = simulate(environment, run["iterations"])
+    return run, successes, fails
+
+def run_row(run, successes, fails, series_filename):
+    return [
+        run["run_id"], run["map"], run["num_agents"], run["width"], run["height"], run["completion_percentage"],
+        json.dumps(run["agent_constants"], sort_keys=True), run["seed"],
+        len(successes), successes[-1] if successes else 0, fails[-1] if fails else 0, series_filename,
+    ]
+
+def save_series(path, successes, fails):
+    np.savez_compressed(path, tick=np.arange(len(successes), dtype=np.int64), success=np.array(successes, dtype=np.int64), fail=np.array(fails, dtype=np.int64))
+
+def load_series(results_dir, run_id):
+    """
+    (tick, success, fail) arrays of one run written by run_sweep
+    """
+    with np.load(os.path.join(results_dir, f"run_{run_id}.npz")) as series:
+        return series["tick"], series["success"], series["fail"]
+
+def run_sweep(runs, results_dir, processes=None):
+    """
+    spreads the runs across a process pool and writes each run as soon as it finishes: its per-tick success/fail
+    counts as column arrays in results_dir/run_<id>.npz, and one row describing it in results_dir/runs.csv
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, "runs.csv"), "w", newline="") as runs_file:
+        writer = csv.writer(runs_file)
+        writer.writerow(RUN_COLUMNS)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [ pool.submit(run_single, run) for run in runs ]
+            for completed, future in enumerate(as_completed(futures), start=1):
+                run, successes, fails = future.result()
+                series_filename = f"run_{run['run_id']}.npz"
+                save_series(os.path.join(results_dir, series_filename), successes, fails)
+                writer.writerow(run_row(run, successes, fails, series_filename))
+                runs_file.flush()
+                print(f"[{completed}/{len(runs)}] run {run['run_id']} seed {run['seed']}: {successes[-1] if successes else 0} successes, {fails[-1] if fails else 0} fails")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a sweep of headless simulations across a process pool")
+    parser.add_argument("sweep", help="JSON file with maps, agent_counts, completion_percentages, seeds and optionally width, height, iterations, agent_constants")
+    parser.add_argument("--results", default="results", help="directory for runs.csv and each run's per-tick success/fail series")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (defaults to the number of cores)")
+    args = parser.parse_args()
+
+    with open(args.sweep) as sweep_file:
+        sweep = json.load(sweep_file)
+    runs = expand_sweep(**sweep)
+    run_sweep(runs, args.results, processes=args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+class AgentGrid:
+    """
+    Uniform grid of buckets (cell_size x cell_size) holding agents by position.
+    With cell_size equal to the communication threshold, every agent within range of a position
+    lies in the 3x3 block of buckets around it.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = max(int(cell_size), 1)
+        self.buckets = defaultdict(list)
+        self.version = 0 # bumped whenever any agent is added or moved, so agents know when cached lookups are stale
+
+    def bucket_key(self, coords):
+        r, c = coords
+        return (r // self.cell_size, c // self.cell_size)
+
+    def rebuild(self, agents):
+        self.buckets = defaultdict(list)
+        for agent in agents:
+            self.buckets[self.bucket_key(agent.pos)].append(agent)
+        self.version += 1
+
+    def move(self, agent, old_coords, new_coords):
+        old_key, new_key = self.bucket_key(old_coords), self.bucket_key(new_coords)
+        if old_key != new_key:
+            self.buckets[old_key].remove(agent)
+            self.buckets[new_key].append(agent)
+        self.version += 1
+
+    def nearby(self, coords):
+        """
+        yields every agent in the buckets around coords - a superset of the agents within cell_size of it
+        """
+        br, bc = self.bucket_key(coords)
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                bucket = self.buckets.get((br + dr, bc + dc))
+                if bucket:
+                    yield from bucket
@@ -0,0 +1,152 @@
+import numpy as np
+from agent import Agent, adjacency_table, exclude_cells
+from environment import Environment
+
+class SwarmState:
+    """
+    Struct-of-arrays storage for a whole swarm: every agent's pdm, explored map, previous goal mask, known obstacles
+    (cells it or a peer crashed into) and position live in one stacked array each, indexed by agent
+    """
+
+    def __init__(self, num_agents, shape, initial_pdm_value=0.4):
+        self.shape = shape
+        self.pdms = np.full((num_agents, *shape), initial_pdm_value)
+        self.explored = np.zeros((num_agents, *shape), dtype=bool)
+        self.goal_masks = np.zeros((num_agents, *shape), dtype=bool)
+        self.known_obstacles = np.zeros((num_agents, *shape), dtype=bool)
+        self.positions = np.zeros((num_agents, 2), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def candidate_moves(self, avoid_known_obstacles=False):
+        """
+        every agent's in-bounds neighbouring cells, sorted by that agent's pdm (ties keep step order)
+        matches what each agent's possible_steps would return for its current position, unless avoid_known_obstacles
+        leaves out the cells that agent knows are obstacles
+        """
+        COLS = self.shape[1]
+        neighbors, counts = adjacency_table(self.shape)
+        flat = self.positions[:, 0] * COLS + self.positions[:, 1]
+        targets, counts = neighbors[flat], counts[flat]
+        rows = np.arange(len(self))[:, None]
+        if avoid_known_obstacles:
+            targets, counts = exclude_cells((targets, counts), self.known_obstacles.reshape(len(self), -1)[rows, targets])
+        valid = np.arange(targets.shape[1]) < counts[:, None]
+
+        danger = self.pdms.reshape(len(self), -1)[rows, targets]
+        danger = np.where(valid, danger, np.inf)
+
+        order = np.argsort(danger, axis=1, kind="stable")
+        sorted_targets = np.take_along_axis(targets, order, axis=1)
+        sorted_targets = np.stack(np.divmod(sorted_targets, COLS), axis=-1).tolist()
+        counts = counts.tolist()
+        return [ [ tuple(target) for target in agent_targets[:count] ] for agent_targets, count in zip(sorted_targets, counts) ]
+
+class SwarmAgent(Agent):
+    """
+    Agent whose pdm, explored map, previous goal mask, known obstacles and position are views into a SwarmState
+    """
+
+    def __init__(self, swarm, index, initial_coords=(0, 0), rng=None):
+        self.swarm = swarm
+        self.index = index
+        self.last_action = None # where the agent last tried to go, which is where it crashed if the step failed
+        self.share_known_obstacles = False # set by the environment when candidate moves avoid known obstacles
+        super().__init__(initial_pdm=swarm.pdms[index], initial_coords=initial_coords, rng=rng)
+
+        # Move the freshly initialised maps into this agent's slot and keep views onto it
+        swarm.pdms[index] = self.pdm
+        swarm.explored[index] = self.explored
+        swarm.goal_masks[index] = self.previous_goal_mask
+        self.pdm = swarm.pdms[index]
+        self.explored = swarm.explored[index]
+        self.previous_goal_mask = swarm.goal_masks[index]
+
+    @property
+    def pos(self):
+        return tuple(self.swarm.positions[self.index].tolist())
+
+    @pos.setter
+    def pos(self, coords):
+        self.swarm.positions[self.index] = coords
+
+    @property
+    def known_obstacles(self):
+        return self.swarm.known_obstacles[self.index]
+
+    def get_next_action(self, possible_next_coords=None):
+        self.last_action = super().get_next_action(possible_next_coords)
+        return self.last_action
+
+    def reset_for_failure(self, coords):
+        self.known_obstacles[*self.last_action] = True
+        super().reset_for_failure(coords)
+
+    def update_others_danger(self):
+        peer_indices = [ other.index for other in self.get_available_agents() ]
+        if peer_indices and self.share_known_obstacles:
+            self.known_obstacles[...] |= self.swarm.known_obstacles[peer_indices].any(axis=0)
+
+        if self.tile_versions is not None:
+            super().update_others_danger()
+            return
+        if not peer_indices:
+            return
+        self.incorporate_other_pdms(self.swarm.pdms[peer_indices])
+        self.incorporate_other_explored_maps(self.swarm.explored[peer_indices])
+
+    def get_state(self):
+        return { **super().get_state(), "known_obstacles": np.array(self.known_obstacles), "last_action": self.last_action }
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.known_obstacles[...] = state.get("known_obstacles", False)
+        self.last_action = state.get("last_action")
+
+class SwarmEnvironment(Environment):
+    """
+    Environment backed by a SwarmState. Candidate generation, obstacle checks and collision detection
+    run over the whole swarm at once; agents still step in order so results match Environment.
+    With avoid_known_obstacles the candidate moves - what recovery and idle agents pick from - leave out the cells
+    each agent knows are obstacles because it or a peer in range crashed into them, which gives up matching Environment.
+    This is not a speedup yet: each agent's step fuses the maps its peers already updated this tick, so the map
+    updates that dominate a tick can't be batched without changing results (200 agents on 128x128 run about as
+    fast as Environment). It is the storage layout ParallelSwarmEnvironment's workers share.
+    """
+
+    def __init__(self, occupancy_data: str | np.ndarray, num_agents, width, height, completion_percentage, agent_class=SwarmAgent, avoid_known_obstacles=False, **environment_args):
+        if environment_args.get("tile_size"):
+            raise ValueError("SwarmEnvironment keeps every map in one dense stacked array, so tile_size is not supported")
+        self.swarm = self.make_swarm_state(num_agents, (height, width))
+        super().__init__(occupancy_data, num_agents, width, height, completion_percentage, agent_class=agent_class, **environment_args)
+        self.avoid_known_obstacles = avoid_known_obstacles
+        for agent in self.agents:
+            agent.share_known_obstacles = avoid_known_obstacles
+
+    def make_swarm_state(self, num_agents, shape):
+        return SwarmState(num_agents, shape)
+
+    def checkpoint_options(self):
+        return { **super().checkpoint_options(), "avoid_known_obstacles": self.avoid_known_obstacles }
+
+    def create_agent(self, index, initial_coords, rng=None):
+        return self.agent_class(self.swarm, index, initial_coords=initial_coords, rng=rng)
+
+    def get_agent_actions(self):
+        candidates = self.swarm.candidate_moves(self.avoid_known_obstacles)
+        return [ agent.get_next_action(possible_next_coords) for agent, possible_next_coords in zip(self.agents, candidates) ]
+
+    def find_obstacle_hits(self, agent_actions):
+        if not agent_actions:
+            return []
+        targets = np.array(agent_actions)
+        return self.occupancy_grid[targets[:, 0], targets[:, 1]].astype(bool)
+
+    def find_collisions(self, agent_actions):
+        if not agent_actions:
+            return []
+        targets = np.array(agent_actions)
+        flat_targets = np.ravel_multi_index((targets[:, 0], targets[:, 1]), self.swarm.shape)
+        _, inverse, counts = np.unique(flat_targets, return_inverse=True, return_counts=True)
+        return counts[inverse] > 1
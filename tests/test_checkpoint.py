@@ -0,0 +1,87 @@
+import contextlib
+import io
+import os
+import numpy as np
+import pytest
+from environment import Environment
+from swarm import SwarmEnvironment
+from tiled_grid import TiledGrid
+
+MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "manyobstacles.png")
+
+def snapshot(environment):
+    return (
+        environment.success,
+        environment.fail,
+        [ agent.pos for agent in environment.agents ],
+        [ np.asarray(agent.pdm).tobytes() for agent in environment.agents ],
+        [ np.asarray(agent.explored).tobytes() for agent in environment.agents ],
+    )
+
+def test_tiled_checkpoint_stays_sparse_and_resumes(tmp_path):
+    path = str(tmp_path / "tiled.ckpt")
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(MAP, 4, 40, 40, 0.75, tile_size=8, seed=5)
+        for _ in range(60):
+            environment.update_pos()
+        environment.save_checkpoint(path)
+        for _ in range(100):
+            environment.update_pos()
+
+        resumed = Environment.load_checkpoint(path)
+        state = resumed.agents[0].get_state()
+        for name in ("pdm", "explored", "previous_goal_mask"):
+            assert isinstance(getattr(resumed.agents[0], name), TiledGrid)
+            assert state[name]["tile_size"] == 8
+        assert len(state["pdm"]["tiles"]) < len(resumed.agents[0].pdm.tile_keys())
+
+        for _ in range(100):
+            resumed.update_pos()
+    assert snapshot(resumed) == snapshot(environment)
+
+def test_swarm_rejects_tile_size():
+    with pytest.raises(ValueError):
+        SwarmEnvironment(MAP, 2, 30, 30, 0.75, tile_size=8, seed=1)
+
+def test_lookahead_checkpoint_resumes_with_pending_plans(tmp_path, monkeypatch):
+    from lookahead import LookaheadPlanner
+    # Searches on this small map are far below the threshold, so hand every one of them to the pool
+    monkeypatch.setattr(LookaheadPlanner, "MIN_EXPECTED_EXPANSION", 0)
+    path = str(tmp_path / "lookahead.ckpt")
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(MAP, 6, 40, 40, 0.75, lookahead_workers=2, seed=7)
+        for _ in range(90):
+            environment.update_pos()
+        environment.save_checkpoint(path)
+        assert environment.lookahead.pending
+        expected = []
+        for _ in range(60):
+            environment.update_pos()
+            expected.append(snapshot(environment))
+        environment.close()
+
+        resumed = Environment.load_checkpoint(path)
+        try:
+            for tick in range(60):
+                resumed.update_pos()
+                assert snapshot(resumed) == expected[tick], f"tick {90 + tick}"
+            assert resumed.lookahead.claimed == environment.lookahead.claimed > 0
+        finally:
+            resumed.close()
+
+def test_periodic_checkpoints_need_a_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(MAP, 2, 30, 30, 0.75, seed=1)
+        with pytest.raises(ValueError):
+            environment.enable_checkpoints(None, 5)
+
+        environment.checkpoint_every = 1
+        with pytest.raises(ValueError):
+            environment.update_pos()
+        assert not list(tmp_path.glob("None*"))
+
+        environment.enable_checkpoints(str(tmp_path / "run.ckpt"), 2)
+        for _ in range(4):
+            environment.update_pos()
+    assert Environment.load_checkpoint(str(tmp_path / "run.ckpt")).tick == 4
@@ -0,0 +1,17 @@
+import json
+import os
+from cli import build_environment, load_scenario
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_map_path_is_relative_to_scenario_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scenario = load_scenario(os.path.join(ROOT, "scenarios", "manyobstacles.toml"))
+    assert os.path.samefile(scenario["map"], os.path.join(ROOT, "manyobstacles.png"))
+    build_environment({ **scenario, "num_agents": 1 }).close()
+
+def test_absolute_map_path_is_kept(tmp_path):
+    map_path = os.path.join(ROOT, "manyobstacles.png")
+    scenario_path = tmp_path / "scenario.json"
+    scenario_path.write_text(json.dumps({ "map": map_path }))
+    assert load_scenario(str(scenario_path))["map"] == map_path
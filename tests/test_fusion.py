@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from agent import Agent
+
+def reference_incorporate_other_pdm(agent, other_pdm):
+    # The per-cell loop fusion used before it was vectorized
+    ROWS, COLS = agent.pdm.shape
+    for row in range(ROWS):
+        for col in range(COLS):
+            my_prob, other_prob = agent.pdm[row, col], other_pdm[row, col]
+            highest_prob, lowest_prob = max(my_prob, other_prob), min(my_prob, other_prob)
+            if highest_prob >= agent.EPSILON:
+                new_prob = highest_prob
+            elif lowest_prob <= agent.VERY_SAFE_THRESHOLD:
+                new_prob = lowest_prob
+            else:
+                new_prob = my_prob
+            agent.pdm[row, col] = new_prob
+
+def reference_incorporate_other_explored(agent, other_explored):
+    ROWS, COLS = agent.explored.shape
+    for row in range(ROWS):
+        for col in range(COLS):
+            agent.explored[row, col] = max(agent.explored[row, col], other_explored[row, col])
+
+def random_pdm(rng, shape):
+    # Mix in values sitting exactly on both thresholds
+    pdm = rng.random(shape)
+    special = rng.choice([Agent.EPSILON, Agent.VERY_SAFE_THRESHOLD, 0.0, 1.0], size=shape)
+    return np.where(rng.random(shape) < 0.3, special, pdm)
+
+@pytest.mark.parametrize("num_peers", [1, 2, 3, 4])
+@pytest.mark.parametrize("seed", range(5))
+def test_batched_fusion_matches_per_cell_loops(num_peers, seed):
+    rng = np.random.default_rng(seed)
+    shape = (12, 9)
+    pdm = random_pdm(rng, shape)
+    explored = (rng.random(shape) < 0.5).astype(float)
+    peer_pdms = [ random_pdm(rng, shape) for _ in range(num_peers) ]
+    peer_explored = [ (rng.random(shape) < 0.5).astype(float) for _ in range(num_peers) ]
+
+    expected = Agent(initial_pdm=pdm)
+    expected.explored[...] = explored
+    for peer_pdm, peer_map in zip(peer_pdms, peer_explored):
+        reference_incorporate_other_pdm(expected, peer_pdm)
+        reference_incorporate_other_explored(expected, peer_map)
+
+    agent = Agent(initial_pdm=pdm)
+    agent.explored[...] = explored
+    agent.incorporate_other_pdms(peer_pdms)
+    agent.incorporate_other_explored_maps(peer_explored)
+
+    assert np.array_equal(agent.pdm, expected.pdm)
+    assert np.array_equal(agent.explored, expected.explored)
@@ -0,0 +1,30 @@
+import contextlib
+import io
+import numpy as np
+from environment import Environment
+
+def test_small_searches_stay_in_process():
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(np.zeros((40, 40), dtype=np.uint8), 4, 40, 40, 0.75, lookahead_workers=1, seed=2)
+        try:
+            for _ in range(50):
+                environment.update_pos()
+                assert all(agent.last_search_expanded < environment.lookahead.MIN_EXPECTED_EXPANSION for agent in environment.agents)
+                assert not environment.lookahead.pending
+        finally:
+            environment.close()
+
+def test_large_searches_are_planned_ahead():
+    size, spacing = 96, 32
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(np.zeros((size, size), dtype=np.uint8), 2, size, size, 1.0, lookahead_workers=1, seed=2)
+        try:
+            explored = np.ones((size, size))
+            explored[spacing // 2::spacing, spacing // 2::spacing] = 0
+            for agent in environment.agents:
+                agent.explored[...] = np.maximum(explored, agent.explored)
+            for _ in range(60):
+                environment.update_pos()
+            assert environment.lookahead.claimed > 0
+        finally:
+            environment.close()
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from PIL import Image
+from environment import Environment
+
+def write_map(directory):
+    path = os.path.join(directory, "map.png")
+    pixels = np.zeros((20, 20), dtype=np.uint8)
+    pixels[5:8, 5:8] = 255
+    Image.fromarray(pixels).save(path)
+    return path
+
+def read_map(path):
+    environment = Environment.__new__(Environment)
+    environment.width, environment.height = 20, 20
+    return environment, environment.read_from_file(path)
+
+def test_cache_sits_next_to_the_map(tmp_path, monkeypatch):
+    maps, elsewhere = tmp_path / "maps", tmp_path / "elsewhere"
+    maps.mkdir()
+    elsewhere.mkdir()
+    path = write_map(str(maps))
+    monkeypatch.chdir(elsewhere)
+
+    _, pixels = read_map(path)
+    assert len(os.listdir(maps / ".map_cache")) == 1
+    assert not os.listdir(elsewhere)
+    assert np.array_equal(read_map(path)[1], pixels)
+
+def test_unwritable_cache_falls_back_to_no_cache(tmp_path, monkeypatch):
+    path = write_map(str(tmp_path))
+    (tmp_path / "not_a_directory").write_text("")
+    monkeypatch.setattr(Environment, "MAP_CACHE_DIR", str(tmp_path / "not_a_directory" / "cache"))
+
+    _, pixels = read_map(path)
+    assert pixels[6, 6] == 1 and pixels.sum() == 9
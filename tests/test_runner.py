@@ -0,0 +1,21 @@
+import csv
+import os
+import numpy as np
+from runner import expand_sweep, load_series, run_single, run_sweep
+
+MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "manyobstacles.png")
+
+def test_sweep_writes_one_row_and_one_series_per_run(tmp_path):
+    runs = expand_sweep([MAP], [2, 3], [0.75], [1, 2], iterations=20)
+    run_sweep(runs, str(tmp_path), processes=1)
+
+    with open(tmp_path / "runs.csv", newline="") as runs_file:
+        rows = sorted(csv.DictReader(runs_file), key=lambda row: int(row["run_id"]))
+    assert [ int(row["run_id"]) for row in rows ] == [ run["run_id"] for run in runs ]
+
+    for run, row in zip(runs, rows):
+        _, successes, fails = run_single(run)
+        tick, success, fail = load_series(str(tmp_path), run["run_id"])
+        assert np.array_equal(tick, np.arange(20))
+        assert success.tolist() == successes and fail.tolist() == fails
+        assert (int(row["ticks"]), int(row["success"]), int(row["fail"])) == (20, successes[-1], fails[-1])
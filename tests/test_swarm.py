@@ -0,0 +1,86 @@
+import contextlib
+import io
+import os
+import numpy as np
+import pytest
+from environment import Environment
+from swarm import SwarmEnvironment
+
+MAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "manyobstacles.png")
+
+@pytest.mark.parametrize("num_agents, size, ticks, seed", [(2, 30, 200, 1), (5, 30, 200, 2), (8, 40, 120, 3)])
+def test_swarm_matches_environment_every_tick(num_agents, size, ticks, seed):
+    # The simulation prints on every crash
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(MAP, num_agents, size, size, 0.75, seed=seed)
+        swarm = SwarmEnvironment(MAP, num_agents, size, size, 0.75, seed=seed)
+        for tick in range(ticks):
+            environment.update_pos()
+            swarm.update_pos()
+
+            assert (swarm.success, swarm.fail) == (environment.success, environment.fail), f"tick {tick}"
+            for agent, swarm_agent in zip(environment.agents, swarm.agents):
+                assert swarm_agent.pos == agent.pos, f"tick {tick}"
+                assert np.array_equal(swarm_agent.pdm, agent.pdm), f"tick {tick}"
+                assert np.array_equal(np.asarray(swarm_agent.explored) != 0, np.asarray(agent.explored) != 0), f"tick {tick}"
+
+def test_parallel_planner_matches_environment():
+    from parallel import ParallelSwarmEnvironment
+    with contextlib.redirect_stdout(io.StringIO()):
+        environment = Environment(MAP, 6, 40, 40, 0.75, seed=4)
+        with ParallelSwarmEnvironment(MAP, 6, 40, 40, 0.75, num_workers=2, seed=4) as parallel:
+            for tick in range(100):
+                environment.update_pos()
+                parallel.update_pos()
+                assert (parallel.success, parallel.fail) == (environment.success, environment.fail), f"tick {tick}"
+                assert [ agent.pos for agent in parallel.agents ] == [ agent.pos for agent in environment.agents ], f"tick {tick}"
+
+def test_exclude_cells_drops_blocked_neighbours():
+    from agent import adjacency_table, exclude_cells
+    neighbors, counts = adjacency_table((4, 4))
+    table = (neighbors[[0, 5]], counts[[0, 5]])
+    blocked = np.isin(table[0], [1, 4])
+    rows, row_counts = exclude_cells(table, blocked)
+    assert rows[0, :row_counts[0]].tolist() == [5]
+    assert row_counts[1] == 6 and not set(rows[1, :row_counts[1]].tolist()) & {1, 4}
+
+    # Nowhere left to go keeps every neighbour
+    rows, row_counts = exclude_cells(table, np.isin(table[0], [1, 4, 5]))
+    assert rows[0, :row_counts[0]].tolist() == [1, 4, 5]
+
+def test_avoid_known_obstacles_learns_from_crashes(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        swarm = SwarmEnvironment(MAP, 8, 40, 40, 0.75, avoid_known_obstacles=True, seed=3)
+        for _ in range(300):
+            swarm.update_pos()
+            for agent, candidates in zip(swarm.agents, swarm.swarm.candidate_moves(True)):
+                if len(candidates) < len(agent.possible_steps(agent.pos)):
+                    assert not any(agent.known_obstacles[*coords] for coords in candidates)
+
+        # Only cells someone actually crashed into are known, and they are all real obstacles
+        known = swarm.swarm.known_obstacles.any(axis=0)
+        assert known.any() and swarm.occupancy_grid[known].all()
+        assert np.count_nonzero(known) <= swarm.obstacle_crashes
+
+        path = str(tmp_path / "swarm.ckpt")
+        swarm.save_checkpoint(path)
+        resumed = Environment.load_checkpoint(path)
+        assert resumed.avoid_known_obstacles
+        assert np.array_equal(resumed.swarm.known_obstacles, swarm.swarm.known_obstacles)
+
+def test_dropped_parallel_environment_cleans_up():
+    import gc
+    from multiprocessing import shared_memory
+    from parallel import ParallelSwarmEnvironment
+    with contextlib.redirect_stdout(io.StringIO()):
+        parallel = ParallelSwarmEnvironment(MAP, 2, 30, 30, 0.75, num_workers=2, seed=1)
+        parallel.update_pos()
+    workers = list(parallel.workers)
+    block_names = [ block.name for block, _, _ in parallel.swarm.blocks.values() ]
+    del parallel
+    gc.collect()
+
+    assert not any(worker.is_alive() for worker in workers)
+    for name in block_names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
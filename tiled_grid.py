@@ -0,0 +1,134 @@
+import numpy as np
+
+class TiledGrid:
+    """
+    2D grid stored as square tiles that are only allocated once something other than the default is written to them.
+    Supports the indexing agents use on their maps: grid[r, c], grid[row_slice, col_slice], grid[...] and np.asarray(grid).
+    """
+
+    def __init__(self, shape, default=0.0, dtype=float, tile_size=32):
+        self.shape = tuple(shape)
+        self.default = default
+        self.dtype = np.dtype(dtype)
+        self.tile_size = tile_size
+        self.tiles = {} # (tile row, tile col) -> tile_size x tile_size array
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def nbytes(self):
+        return len(self.tiles) * self.tile_size * self.tile_size * self.dtype.itemsize
+
+    def copy(self):
+        grid = TiledGrid(self.shape, default=self.default, dtype=self.dtype, tile_size=self.tile_size)
+        grid.tiles = { key: tile.copy() for key, tile in self.tiles.items() }
+        return grid
+
+    def get_state(self):
+        """
+        the allocated tiles only, for checkpointing without densifying the grid
+        """
+        return { "tile_size": self.tile_size, "tiles": { key: tile.copy() for key, tile in self.tiles.items() } }
+
+    def set_state(self, state):
+        if state["tile_size"] != self.tile_size:
+            raise ValueError(f"Saved tiles are {state['tile_size']} cells wide, this grid's are {self.tile_size}")
+        self.tiles = { key: np.array(tile, dtype=self.dtype) for key, tile in state["tiles"].items() }
+
+    def new_tile(self):
+        return np.full((self.tile_size, self.tile_size), self.default, dtype=self.dtype)
+
+    def tile_keys(self):
+        ROWS, COLS = self.shape
+        return [ (tr, tc) for tr in range(-(-ROWS // self.tile_size)) for tc in range(-(-COLS // self.tile_size)) ]
+
+    def _bounds(self, key):
+        """
+        (row start, row stop, col start, col stop) of a rectangular key - a pair of slices or Ellipsis
+        """
+        ROWS, COLS = self.shape
+        if key is Ellipsis or key == (Ellipsis,):
+            return 0, ROWS, 0, COLS
+        rows, cols = key
+        row_start, row_stop, row_step = rows.indices(ROWS)
+        col_start, col_stop, col_step = cols.indices(COLS)
+        if row_step != 1 or col_step != 1:
+            raise IndexError("TiledGrid only supports contiguous slices")
+        return row_start, max(row_stop, row_start), col_start, max(col_stop, col_start)
+
+    def _overlaps(self, row_start, row_stop, col_start, col_stop):
+        """
+        yields (tile key, slices into the tile, slices into the region) for every tile the region touches
+        """
+        size = self.tile_size
+        for tr in range(row_start // size, -(-row_stop // size)):
+            for tc in range(col_start // size, -(-col_stop // size)):
+                r0, r1 = max(row_start, tr * size), min(row_stop, (tr + 1) * size)
+                c0, c1 = max(col_start, tc * size), min(col_stop, (tc + 1) * size)
+                tile_slices = (slice(r0 - tr * size, r1 - tr * size), slice(c0 - tc * size, c1 - tc * size))
+                region_slices = (slice(r0 - row_start, r1 - row_start), slice(c0 - col_start, c1 - col_start))
+                yield (tr, tc), tile_slices, region_slices
+
+    def __getitem__(self, key):
+        if type(key) is tuple and len(key) == 2 and not isinstance(key[0], slice):
+            r, c = key
+            tile = self.tiles.get((r // self.tile_size, c // self.tile_size))
+            if tile is None:
+                if not (0 <= r < self.shape[0] and 0 <= c < self.shape[1]):
+                    raise IndexError(f"{key} is outside a grid of shape {self.shape}")
+                return self.default
+            return tile[r % self.tile_size, c % self.tile_size]
+
+        row_start, row_stop, col_start, col_stop = self._bounds(key)
+        region = np.full((row_stop - row_start, col_stop - col_start), self.default, dtype=self.dtype)
+        for tile_key, tile_slices, region_slices in self._overlaps(row_start, row_stop, col_start, col_stop):
+            tile = self.tiles.get(tile_key)
+            if tile is not None:
+                region[region_slices] = tile[tile_slices]
+        return region
+
+    def __setitem__(self, key, value):
+        if type(key) is tuple and len(key) == 2 and not isinstance(key[0], slice):
+            r, c = key
+            if not (0 <= r < self.shape[0] and 0 <= c < self.shape[1]):
+                raise IndexError(f"{key} is outside a grid of shape {self.shape}")
+            tile_key = (r // self.tile_size, c // self.tile_size)
+            tile = self.tiles.get(tile_key)
+            if tile is None:
+                if value == self.default:
+                    return
+                tile = self.tiles[tile_key] = self.new_tile()
+            tile[r % self.tile_size, c % self.tile_size] = value
+            return
+
+        row_start, row_stop, col_start, col_stop = self._bounds(key)
+        value = np.asarray(value, dtype=self.dtype)
+        for tile_key, tile_slices, region_slices in self._overlaps(row_start, row_stop, col_start, col_stop):
+            tile_value = value if value.ndim == 0 else value[region_slices]
+            tile = self.tiles.get(tile_key)
+            if tile is None:
+                if np.all(tile_value == self.default):
+                    continue
+                tile = self.tiles[tile_key] = self.new_tile()
+            tile[tile_slices] = tile_value
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self[...]
+        return dense if dtype is None else dense.astype(dtype)
+
+    def combine(self, others, func):
+        """
+        replaces each tile with func(tile, stacked tiles of the others), skipping tiles that are default everywhere
+        func must map all-default inputs to the default, which is what makes skipping them exact
+        """
+        keys = set(self.tiles)
+        for other in others:
+            keys.update(other.tiles)
+
+        default_tile = self.new_tile()
+        for key in keys:
+            mine = self.tiles.get(key, default_tile)
+            stacked = np.stack([ other.tiles.get(key, default_tile) for other in others ])
+            self.tiles[key] = np.asarray(func(mine, stacked), dtype=self.dtype)
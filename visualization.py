@@ -4,16 +4,26 @@ from tkinter import *
 from environment import Environment
 from agent import Agent
 import numpy as np
+from colors import HEX_COLORS, pdm_color_codes
 
 class RobotVisualization:
     """
     Visualization of a Robot simulation.
     """
 
-    def __init__(self, environment, delay=0.00):
-        "Initializes a visualization with the specified parameters."
+    def __init__(self, environment, delay=0.00, max_fps=None, frame_skip=0):
+        """
+        Initializes a visualization with the specified parameters.
+        max_fps caps how often the canvas is redrawn and frame_skip draws only every (frame_skip + 1)th update,
+        so rendering never holds back the simulation
+        """
         # Number of seconds to pause after each frame
         self.delay = delay
+        self.max_fps = max_fps
+        self.frame_skip = frame_skip
+        self.frame = 0
+        self.last_draw_time = None
+
         width = environment.occupancy_grid.shape[1]
         height = environment.occupancy_grid.shape[0]
         self.max_dim = max(width, height)
@@ -31,35 +41,19 @@ class RobotVisualization:
         x2, y2 = self._map_coords(width, height)
         self.w.create_rectangle(x1, y1, x2, y2, fill="white", outline="white")
 
-        # Draw black/white tiles 
-        self.tiles = set()
-        for i in range(width):
-            for j in range(height):
-                x1, y1 = self._map_coords(i, j)
-                x2, y2 = self._map_coords(i + 1, j + 1)
-                if not environment.is_occupied((i, j)):
-                    self.tiles.add(self.w.create_rectangle(
-                        x1, y1, x2, y2, fill="black", outline="black"
-                    ))
-                else:
-                    self.tiles.add(self.w.create_rectangle(
-                        x1, y1, x2, y2, fill="white", outline="white"
-                    ))
-
-        # Draw black/white tiles 
-        self.tiles = set()
-        for i in range(width):
-            for j in range(height):
-                x1, y1 = self._map_coords(i, j)
-                x2, y2 = self._map_coords(i + 1, j + 1)
-                if not environment.is_occupied((i, j)):
-                    self.tiles.add(self.w.create_rectangle(
-                        x1 + 500, y1, x2 + 500, y2, fill="black", outline="black"
-                    ))
-                else:
-                    self.tiles.add(self.w.create_rectangle(
-                        x1 + 500, y1, x2 + 500, y2, fill="white", outline="white"
-                    ))
+        # Draw one tile per cell for each of the two pdm panels - update only recolours them
+        self.obstacles = self._obstacle_mask(environment)
+        self.tiles = [ np.zeros((width, height), dtype=int) for _ in range(2) ]
+        self.tile_colors = [ np.where(self.obstacles, -1, -2) for _ in range(2) ] # -1 is white, -2 black, otherwise the pdm colour
+        for panel, x_offset in enumerate((0, 500)):
+            for i in range(width):
+                for j in range(height):
+                    x1, y1 = self._map_coords(i, j)
+                    x2, y2 = self._map_coords(i + 1, j + 1)
+                    color = "white" if self.obstacles[i, j] else "black"
+                    self.tiles[panel][i, j] = self.w.create_rectangle(
+                        x1 + x_offset, y1, x2 + x_offset, y2, fill=color, outline=color
+                    )
 
         self.robots = None
         self.time = 0
@@ -82,87 +76,50 @@ class RobotVisualization:
             250 + 450 * ((self.height / 2.0 - y) / self.max_dim) + 1,
         )
 
+    def _obstacle_mask(self, environment):
+        return np.array([ [ environment.is_occupied((i, j)) for j in range(self.height) ] for i in range(self.width) ], dtype=bool)
+
+    def _pdm_colors(self, agent):
+        "Colour code for each tile: -1 for obstacles (white), otherwise int(probability * 255)."
+        probabilities = np.asarray(agent.pdm)[:self.width, :self.height]
+        return pdm_color_codes(probabilities, self.obstacles)
+
+    def _recolor_panel(self, panel, colors):
+        changed = np.argwhere(colors != self.tile_colors[panel])
+        for i, j in changed:
+            Hex = HEX_COLORS[colors[i, j]]
+            self.w.itemconfigure(self.tiles[panel][i, j], fill=Hex, outline=Hex)
+        self.tile_colors[panel] = colors
+
+    def _should_draw(self):
+        self.frame += 1
+        if self.frame_skip and (self.frame - 1) % (self.frame_skip + 1) != 0:
+            return False
+        now = time.perf_counter()
+        if self.max_fps and self.last_draw_time is not None and now - self.last_draw_time < 1 / self.max_fps:
+            return False
+        self.last_draw_time = now
+        return True
+
     def update(self, environment):
         "Redraws the visualization with the specified map and robot state."
 
-        # print("Pre-delete")
-
-        # print(len(self.w.find_all()))
-
-        # print(len(self.w))
+        if not self._should_draw():
+            return
 
-        # Delete all unfurnished tiles
-        for obj in self.tiles:
-            self.w.delete(obj)
-
-        # print("Pre-draw")
-
-        # Redraw tiles
-        self.tiles = set()
+        # Recolour only the tiles whose pdm colour changed since the last drawn frame
         # first map
-
-        for i in range(self.width):
-            for j in range(self.height):
-                x1, y1 = self._map_coords(i, j)
-                x2, y2 = self._map_coords(i + 1, j + 1)
-
-                # figure out color
-                probability = environment.agents[0].get_probability_obstacle((i, j))
-                obstacle = environment.is_occupied((i, j))
-                if obstacle:
-                    r = 255
-                    g = 255
-                    b = 255
-                else:
-                    color = int(probability * 255)
-                    r = color
-                    g = 255 - color
-                    b = 0
-                
-                rgb = r, g, b
-                Hex = "#%02x%02x%02x" % rgb
-                self.tiles.add(self.w.create_rectangle(
-                    x1, y1, x2, y2, fill="black", outline="black"
-                ))
-                self.tiles.add(self.w.create_rectangle(
-                    x1, y1, x2, y2, fill=str(Hex), outline=str(Hex)
-                ))
+        self._recolor_panel(0, self._pdm_colors(environment.agents[0]))
 
         #second map
         if len(environment.agents) > 1:
-            for i in range(self.width):
-                for j in range(self.height):
-                    x1, y1 = self._map_coords(i, j)
-                    x2, y2 = self._map_coords(i + 1, j + 1)
-
-                    # figure out color
-                    probability = environment.agents[1].get_probability_obstacle((i, j))
-                    obstacle = environment.is_occupied((i, j))
-                    if obstacle:
-                        r = 255
-                        g = 255
-                        b = 255
-                    else:
-                        color = int(probability * 255)
-                        r = color
-                        g = 255 - color
-                        b = 0
-                    
-                    rgb = r, g, b
-                    Hex = "#%02x%02x%02x" % rgb
-                    self.tiles.add(self.w.create_rectangle(
-                        x1+500, y1, x2+500, y2, fill="black", outline="black"
-                    ))
-                    self.tiles.add(self.w.create_rectangle(
-                        x1+500, y1, x2+500, y2, fill=str(Hex), outline=str(Hex)
-                    ))
+            self._recolor_panel(1, self._pdm_colors(environment.agents[1]))
 
         # print("Pre-robot deleting")
         # Delete all existing robots.
         if self.robots:
             for robot in self.robots:
                 self.w.delete(robot)
-                self.master.update_idletasks()
         
         # print("Pre-robot draw")
         